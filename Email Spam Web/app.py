@@ -1,5 +1,7 @@
-from flask import Flask, request, jsonify,render_template
+from flask import Flask, request, jsonify,render_template, Response, stream_with_context
 import pickle
+import json
+from spam_batch import chunked, score_chunk, parse_jsonl_line
 
 
 with open('spam_classifier_nb_model.pkl', 'rb') as model_file:
@@ -34,6 +36,68 @@ def classify():
 
     # Return the result to the user
     return render_template('result.html', result=result)
+# Many emails at once: {"emails": ["text", ...]} or {"emails": [{"id": ..., "text": ...}, ...]};
+# vectorised and predicted together, BATCH_CHUNK emails at a time
+BATCH_CHUNK = 1000
+BATCH_LIMIT = 100000
+
+def parse_threshold(value):
+    # Spam probability above which an email is spam, between 0 and 1; None if invalid
+    if isinstance(value, bool):
+        return None
+    try:
+        threshold = float(value)
+    except (TypeError, ValueError):
+        return None
+    return threshold if 0.0 <= threshold <= 1.0 else None
+
+def email_record(item, number):
+    if isinstance(item, str):
+        return number, item
+    if isinstance(item, dict) and isinstance(item.get('text'), str):
+        return item.get('id', number), item['text']
+    return None
+
+def score_chunks(records, threshold):
+    for chunk in chunked(records, BATCH_CHUNK):
+        yield from score_chunk(chunk, model, vectorizer, threshold)
+
+@app.route('/classify/batch', methods=['POST'])
+def classify_batch():
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get('emails'), list):
+        return jsonify({'error': 'expected {"emails": [...]}'}), 400
+    emails = payload['emails']
+    if len(emails) > BATCH_LIMIT:
+        return jsonify({'error': f'at most {BATCH_LIMIT} emails per request; use /classify/stream'}), 413
+    threshold = parse_threshold(payload.get('threshold', 0.5))
+    if threshold is None:
+        return jsonify({'error': 'threshold must be a number between 0 and 1'}), 400
+    records = [email_record(item, number) for number, item in enumerate(emails)]
+    invalid = [number for number, record in enumerate(records) if record is None]
+    if invalid:
+        return jsonify({'error': 'every email must be a string or an object with a string "text"',
+                        'invalid': invalid[:100]}), 400
+    return jsonify({'results': list(score_chunks(records, threshold))})
+
+# Any number of emails as JSON lines ({"id": ..., "text": ...}) in, one result line out per email;
+# a line that is not such an object gets {"id": ..., "error": ...} in its place
+@app.route('/classify/stream', methods=['POST'])
+def classify_stream():
+    threshold = parse_threshold(request.args.get('threshold', 0.5))
+    if threshold is None:
+        return jsonify({'error': 'threshold must be a number between 0 and 1'}), 400
+
+    def records():
+        for number, line in enumerate(request.stream):
+            if line.strip():
+                yield parse_jsonl_line(line, number)
+
+    def results():
+        for result in score_chunks(records(), threshold):
+            yield json.dumps(result) + '\n'
+    return Response(stream_with_context(results()), mimetype='application/x-ndjson')
+
 @app.route("/about")
 def about():
   return render_template("about.html")
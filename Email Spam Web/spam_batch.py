@@ -0,0 +1,208 @@
+"""Score whole mailboxes with the spam classifier.
+
+    python spam_batch.py mailbox.mbox --output scores.jsonl
+    python spam_batch.py emails.jsonl --field body --chunk-size 5000 --workers 4
+
+Reads emails from an mbox file or a JSONL file (one JSON object per line)
+without loading the file into memory, vectorises each chunk of emails
+with one sparse transform and predicts the whole chunk at once. With
+--workers > 1 chunks are scored in a process pool, each worker loading
+the model once. Writes one JSON line per email: its id, whether it is
+spam and the spam probability.
+"""
+import argparse
+import itertools
+import json
+import mailbox
+import os
+import pickle
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(HERE, 'spam_classifier_nb_model.pkl')
+VECTORIZER_PATH = os.path.join(HERE, 'spam_classifier_vectorizer.pkl')
+
+TAG = re.compile(r'<[^>]+>')
+
+
+class InvalidEmail(Exception):
+    """Stands in for the text of a record that cannot be scored; its result is an error."""
+
+
+def load_model(model_path=MODEL_PATH, vectorizer_path=VECTORIZER_PATH):
+    with open(model_path, 'rb') as model_file:
+        model = pickle.load(model_file)
+    with open(vectorizer_path, 'rb') as vectorizer_file:
+        vectorizer = pickle.load(vectorizer_file)
+    return model, vectorizer
+
+
+def score(texts, model, vectorizer, threshold=0.5):
+    """
+    Spam probability and verdict of every email text, in one transform and one prediction.
+    An email is spam above `threshold`, so at 0.5 the verdicts match model.predict
+    (emails without any known word get exactly 0.5 and are not spam).
+    """
+    if not texts:
+        return []
+    features = vectorizer.transform(texts)
+    if hasattr(model, 'predict_proba'):
+        spam_column = list(model.classes_).index(1)
+        probabilities = model.predict_proba(features)[:, spam_column]
+        return [{'spam': bool(p > threshold), 'probability': float(p)} for p in probabilities]
+    return [{'spam': bool(p == 1), 'probability': None} for p in model.predict(features)]
+
+
+def score_chunk(chunk, model, vectorizer, threshold=0.5):
+    """
+    Results of (id, text) records in order: {'id', 'spam', 'probability'}, or {'id', 'error'}
+    for records whose text is not a string (or an InvalidEmail).
+    """
+    valid = [i for i, (_, text) in enumerate(chunk) if isinstance(text, str)]
+    results = [None] * len(chunk)
+    for i, result in zip(valid, score([chunk[i][1] for i in valid], model, vectorizer, threshold)):
+        results[i] = dict(result, id=chunk[i][0])
+    for i, (email_id, text) in enumerate(chunk):
+        if results[i] is None:
+            error = str(text) if isinstance(text, InvalidEmail) else 'email text must be a string'
+            results[i] = {'id': email_id, 'error': error}
+    return results
+
+
+def message_text(message):
+    """Subject and plain-text body of an email.message.Message (HTML stripped of tags if there is no plain text)."""
+    parts = {'text/plain': [], 'text/html': []}
+    for part in message.walk():
+        content_type = part.get_content_type()
+        if content_type in parts and part.get_content_disposition() != 'attachment':
+            payload = part.get_payload(decode=True) or b''
+            try:
+                text = payload.decode(part.get_content_charset() or 'utf-8', errors='replace')
+            except LookupError:  # a charset Python does not know
+                text = payload.decode('utf-8', errors='replace')
+            parts[content_type].append(text)
+    body = '\n'.join(parts['text/plain']) or TAG.sub(' ', '\n'.join(parts['text/html']))
+    return f"{message.get('Subject', '')}\n{body}"
+
+
+def read_mbox(path):
+    """(id, text) of every message of an mbox file; the id is its Message-ID, else its position."""
+    box = mailbox.mbox(path, create=False)
+    try:
+        for position, message in enumerate(box):
+            if message is None:
+                continue
+            yield message.get('Message-ID', position), message_text(message)
+    finally:
+        box.close()
+
+
+def parse_jsonl_line(line, number, field='text'):
+    """(id, text) of one JSONL line; the id is the record's 'id', else the line number.
+
+    Lines that are not a JSON object with a string `field` give an InvalidEmail as text.
+    """
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return number, InvalidEmail(f'line {number}: not valid JSON')
+    if not isinstance(record, dict):
+        return number, InvalidEmail(f'line {number}: expected a JSON object')
+    text = record.get(field)
+    if not isinstance(text, str):
+        return record.get('id', number), InvalidEmail(f'line {number}: "{field}" must be a string')
+    return record.get('id', number), text
+
+
+def read_jsonl(path, field='text'):
+    """(id, text) of every line of a JSONL file, see parse_jsonl_line."""
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f):
+            if line.strip():
+                yield parse_jsonl_line(line, number, field)
+
+
+def read_emails(path, fmt=None, field='text'):
+    fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.ndjson', '.json')) else 'mbox')
+    return read_jsonl(path, field) if fmt == 'jsonl' else read_mbox(path)
+
+
+def chunked(records, size):
+    records = iter(records)
+    while True:
+        chunk = list(itertools.islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+_worker_model = None
+
+
+def _load_worker(model_path, vectorizer_path):
+    global _worker_model
+    _worker_model = load_model(model_path, vectorizer_path)
+
+
+def _score_chunk(chunk, threshold):
+    model, vectorizer = _worker_model
+    return score_chunk(chunk, model, vectorizer, threshold)
+
+
+def score_records(records, chunk_size=1000, workers=1, threshold=0.5,
+                  model_path=MODEL_PATH, vectorizer_path=VECTORIZER_PATH):
+    """
+    Score (id, text) records chunk by chunk, yielding score_chunk results in input order.
+    With several workers at most 2 * workers chunks are in flight, so memory stays bounded.
+    """
+    if workers <= 1:
+        _load_worker(model_path, vectorizer_path)
+        for chunk in chunked(records, chunk_size):
+            yield from _score_chunk(chunk, threshold)
+        return
+
+    with ProcessPoolExecutor(workers, initializer=_load_worker, initargs=(model_path, vectorizer_path)) as pool:
+        pending = []
+        for chunk in chunked(records, chunk_size):
+            pending.append(pool.submit(_score_chunk, chunk, threshold))
+            if len(pending) >= 2 * workers:
+                yield from pending.pop(0).result()
+        for future in pending:
+            yield from future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify the emails of an mbox or JSONL file as spam or not.")
+    parser.add_argument('path', help="mbox file, or JSONL with one email object per line")
+    parser.add_argument('--format', choices=('mbox', 'jsonl'), help="Input format (default: from the extension)")
+    parser.add_argument('--field', default='text', help="JSONL field holding the email text")
+    parser.add_argument('--chunk-size', type=int, default=1000, help="Emails vectorised and predicted together")
+    parser.add_argument('--workers', type=int, default=1, help="Scoring processes (0 for one per core)")
+    parser.add_argument('--threshold', type=float, default=0.5, help="Spam probability above which an email is spam")
+    parser.add_argument('--output', help="JSONL file for the results (default: stdout)")
+    args = parser.parse_args()
+
+    workers = args.workers or os.cpu_count()
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    start = time.perf_counter()
+    total = spam = errors = 0
+    try:
+        for result in score_records(read_emails(args.path, args.format, args.field), args.chunk_size, workers,
+                                    args.threshold):
+            out.write(json.dumps(result) + '\n')
+            total += 1
+            spam += result.get('spam', False)
+            errors += 'error' in result
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    seconds = time.perf_counter() - start
+    print(f"{total} emails, {spam} spam, {errors} invalid, {seconds:.1f}s ({total / seconds if seconds else 0:.0f} emails/s)",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,14 @@
 from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response
 import cv2
 import os
+import json
+import queue
 from motion_detection.motion_detector import MotionDetector
+from motion_detection.motion_engine import MotionEngine
+from motion_detection.detectors import create_detector
+from motion_detection.sessions import SessionManager
+from motion_detection.events import create_event_bus
+from motion_detection.snapshot_store import SnapshotStore
 from datetime import datetime, timedelta
 import random
 import numpy as np
@@ -19,11 +26,48 @@ users = {}
 # Initialize the face cascade for face detection
 face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
 
+# Object detector: 'yolov4', 'yolov4-tiny' or 'onnx' (see motion_detection/detectors.py);
+# a tiny model or a smaller input size is much faster on CPU-only machines
+OBJECT_DETECTOR = os.environ.get('OBJECT_DETECTOR', 'yolov4')
+DETECTOR_INPUT_SIZE = int(os.environ.get('DETECTOR_INPUT_SIZE', 416))
+
+# Snapshots are indexed in SQLite, filed by day and kept for 7 days
+snapshot_store = SnapshotStore('static/snapshots', max_age=7 * 24 * 3600, max_count=50000, thumbnail_width=160)
+
+# Alarms and snapshots are published here and handled in background threads;
+# browsers get the alerts from /alerts/stream
+events = create_event_bus(snapshot_store)
+
 # Initialize Motion Detector
-motion_detector = MotionDetector(motion_threshold=5, reset_interval=5)
+motion_detector = MotionDetector(motion_threshold=5, reset_interval=5, events=events,
+                                 object_detector=create_detector(OBJECT_DETECTOR, input_size=DETECTOR_INPUT_SIZE))
+
+# Multi-candidate proctoring: every session is one candidate's stream (uploaded
+# frames or a video file / RTSP source); YOLO runs batched across sessions on
+# a shared pool of PROCTOR_WORKERS workers
+session_manager = SessionManager(lambda: create_detector(OBJECT_DETECTOR, input_size=DETECTOR_INPUT_SIZE),
+                                 workers=int(os.environ.get('PROCTOR_WORKERS', 2)),
+                                 idle_timeout=float(os.environ.get('PROCTOR_IDLE_TIMEOUT', 600)),
+                                 motion_threshold=5, reset_interval=5, events=events)
+
+# Video files, frame directories and stream URLs sessions may read from, separated
+# by os.pathsep; a directory allows everything inside it. Empty: uploads only.
+PROCTOR_SOURCES = [source for source in os.environ.get('PROCTOR_SOURCES', '').split(os.pathsep) if source]
 
-# Ensure snapshots directory exists
-os.makedirs('static/snapshots', exist_ok=True)
+def source_allowed(source):
+    for allowed in PROCTOR_SOURCES:
+        if source == allowed:
+            return True
+        if os.path.isdir(allowed):
+            directory = os.path.realpath(allowed)
+            if os.path.commonpath([directory, os.path.realpath(source)]) == directory:
+                return True
+    return False
+
+def valid_roi(roi):
+    return (isinstance(roi, list) and len(roi) == 4
+            and all(isinstance(v, int) and not isinstance(v, bool) for v in roi)
+            and roi[0] >= 0 and roi[1] >= 0 and min(roi[2], roi[3]) >= MotionEngine.MIN_ROI_SIZE)
 
 # Home Route
 @app.route('/')
@@ -86,16 +130,112 @@ def motion_detected():
     detected = motion_detector.detect_motion()
     return jsonify({'motionDetected': detected})
 
+def viewer_options():
+    # ?quality=10-95&width=<px>&delta=1 (only send frames that changed)
+    return {'quality': request.args.get('quality', 80, type=int),
+            'width': request.args.get('width', type=int),
+            'delta': request.args.get('delta', '0') not in ('0', 'false', '')}
+
+# Every viewer shares one capture and one JPEG encode per quality/width
 @app.route('/video_feed')
 def video_feed():
-    return Response(motion_detector.get_video_stream(),
+    return Response(motion_detector.get_video_stream(**viewer_options()),
+                    mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@app.route('/video_feed/stats')
+def video_feed_stats():
+    return jsonify(motion_detector.broadcaster.stats())
+
+# How often YOLO and DeepFace actually ran on the stream
+@app.route('/inference_stats')
+def inference_stats():
+    return jsonify(motion_detector.scheduler.stats())
+
+# Server-Sent Events: motion alarms and saved snapshots as they happen
+@app.route('/alerts/stream')
+def alert_stream():
+    subscription = events.subscribe(kinds=('alarm', 'snapshot_saved'))
+
+    def stream():
+        try:
+            yield 'retry: 2000\n\n'  # sends the headers now; reconnect after 2 s if dropped
+            while True:
+                try:
+                    event = subscription.get(timeout=15)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            events.unsubscribe(subscription)
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/sessions', methods=['GET', 'POST'])
+def proctor_sessions():
+    # JSON body: optional "source" (video file / RTSP URL from PROCTOR_SOURCES) and "roi" ([x, y, w, h] seat area)
+    if request.method == 'POST':
+        payload = request.get_json(silent=True)
+        if payload is None:
+            payload = {}
+        if not isinstance(payload, dict):
+            return jsonify({'error': 'expected a JSON object'}), 400
+        source, roi = payload.get('source'), payload.get('roi')
+        if source is not None and not (isinstance(source, str) and source_allowed(source)):
+            return jsonify({'error': 'source not allowed'}), 403
+        if roi is not None and not valid_roi(roi):
+            return jsonify({'error': 'roi must be [x, y, w, h]: non-negative integers, '
+                                     f'w and h at least {MotionEngine.MIN_ROI_SIZE}'}), 400
+        proctor = session_manager.create(source, roi=roi)
+        return jsonify({'session_id': proctor.id}), 201
+    return jsonify(session_manager.stats())
+
+@app.route('/sessions/<session_id>', methods=['GET', 'DELETE'])
+def proctor_session(session_id):
+    if request.method == 'DELETE':
+        if not session_manager.close(session_id):
+            return jsonify({'error': 'unknown session'}), 404
+        return jsonify({'closed': session_id})
+    proctor = session_manager.get(session_id)
+    if proctor is None:
+        return jsonify({'error': 'unknown session'}), 404
+    return jsonify(proctor.status())
+
+# Upload one frame of a session, as the request body or a 'frame' file field
+@app.route('/sessions/<session_id>/frames', methods=['POST'])
+def session_frame(session_id):
+    proctor = session_manager.get(session_id)
+    if proctor is None:
+        return jsonify({'error': 'unknown session'}), 404
+    data = request.files['frame'].read() if 'frame' in request.files else request.get_data()
+    if not data:
+        return jsonify({'error': 'expected a JPEG or PNG image'}), 400
+    frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        return jsonify({'error': 'expected a JPEG or PNG image'}), 400
+    return jsonify({'motionDetected': proctor.submit(frame)})
+
+@app.route('/sessions/<session_id>/video_feed')
+def session_video_feed(session_id):
+    proctor = session_manager.get(session_id)
+    if proctor is None:
+        return jsonify({'error': 'unknown session'}), 404
+
+    return Response(proctor.broadcaster.stream(**viewer_options()),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
+# Recent snapshots first, one page at a time: ?limit=&before=<next>&session=
+# or a time range with ?start=&end= (Unix seconds)
 @app.route('/snapshots')
 def snapshots():
-    files = os.listdir('static/snapshots')
-    files.sort(reverse=True)  # Show recent snapshots first
-    return jsonify(files)
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    session_id = request.args.get('session')
+    start = request.args.get('start', type=float)
+    end = request.args.get('end', type=float)
+    if start is not None or end is not None:
+        records = snapshot_store.between(start or 0.0, end or float('inf'), session_id, limit)
+        return jsonify({'snapshots': records})
+    records, next_cursor = snapshot_store.page(limit, request.args.get('before', type=int), session_id)
+    return jsonify({'snapshots': records, 'next': next_cursor})
 # Exam Route
 @app.route('/question')
 def question():
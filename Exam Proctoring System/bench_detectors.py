@@ -0,0 +1,128 @@
+"""Speed against accuracy of the object detector configurations.
+
+    python bench_detectors.py --video clip.mp4 --labels clip_labels.json \
+        --detectors yolov4 yolov4-tiny onnx --sizes 320 416
+
+Runs every detector at every input size over the frames of a local clip
+and reports frames per second and, if ground truth is given, AP@0.5 per
+proctoring class and their mean (mAP). The labels file maps frame
+indexes to boxes:
+
+    {"12": [{"label": "cell phone", "box": [x, y, w, h]}, ...], ...}
+
+With labels only the annotated frames are run; without them every
+--step-th frame is. Detectors whose model files are missing are skipped.
+"""
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from motion_detection.detectors import PROCTORING_CLASSES, create_detector
+
+
+def read_frames(path, indexes=None, step=1, limit=None):
+    """(index, frame) pairs of a video, restricted to `indexes` if given."""
+    cap = cv2.VideoCapture(path)
+    frames = []
+    index = 0
+    while limit is None or len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if (index in indexes) if indexes is not None else index % step == 0:
+            frames.append((index, frame))
+        index += 1
+    cap.release()
+    return frames
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    overlap_w = min(ax + aw, bx + bw) - max(ax, bx)
+    overlap_h = min(ay + ah, by + bh) - max(ay, by)
+    if overlap_w <= 0 or overlap_h <= 0:
+        return 0.0
+    overlap = overlap_w * overlap_h
+    return overlap / (aw * ah + bw * bh - overlap)
+
+
+def average_precision(predictions, truth, label, iou_threshold=0.5):
+    """VOC-style AP of one class; None if the class never occurs in `truth`."""
+    positives = sum(1 for boxes in truth.values() for l, _ in boxes if l == label)
+    if positives == 0:
+        return None
+    candidates = sorted(((confidence, index, box) for index, detections in predictions.items()
+                         for l, confidence, box in detections if l == label), reverse=True)
+    matched = set()
+    hits = []
+    for confidence, index, box in candidates:
+        best, best_iou = None, iou_threshold
+        for i, (l, true_box) in enumerate(truth.get(index, [])):
+            if l == label and (index, i) not in matched:
+                overlap = iou(box, true_box)
+                if overlap >= best_iou:
+                    best, best_iou = i, overlap
+        hits.append(best is not None)
+        if best is not None:
+            matched.add((index, best))
+
+    hits = np.array(hits, dtype=bool)
+    true_positives = np.cumsum(hits)
+    recall = np.concatenate([[0.0], true_positives / positives, [1.0]])
+    precision = np.concatenate([[1.0], true_positives / np.arange(1, len(hits) + 1), [0.0]])
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    return float(np.sum(np.diff(recall) * precision[1:]))
+
+
+def load_labels(path):
+    with open(path) as f:
+        raw = json.load(f)
+    return {int(index): [(box['label'], tuple(box['box'])) for box in boxes] for index, boxes in raw.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare object detectors on a local clip.")
+    parser.add_argument('--video', required=True, help="Video file to run the detectors on")
+    parser.add_argument('--labels', help="Ground-truth boxes as JSON (see module docstring)")
+    parser.add_argument('--detectors', nargs='+', default=['yolov4', 'yolov4-tiny'])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[320, 416])
+    parser.add_argument('--step', type=int, default=5, help="Use every n-th frame when there are no labels")
+    parser.add_argument('--limit', type=int, default=200, help="Most frames to run")
+    args = parser.parse_args()
+
+    truth = load_labels(args.labels) if args.labels else None
+    frames = read_frames(args.video, indexes=set(truth) if truth else None, step=args.step, limit=args.limit)
+    if not frames:
+        raise SystemExit(f"No frames read from {args.video}")
+    print(f"{len(frames)} frames from {args.video}")
+
+    header = f"{'detector':12s} {'size':>5s} {'fps':>7s}"
+    if truth:
+        header += f" {'mAP@.5':>7s} " + " ".join(f"{label:>10s}" for label in PROCTORING_CLASSES)
+    print(header)
+
+    for name in args.detectors:
+        for size in args.sizes:
+            try:
+                detector = create_detector(name, input_size=size)
+            except (cv2.error, ImportError, OSError) as e:
+                print(f"{name:12s} {size:5d} skipped: {str(e).strip()}")
+                break
+            detector.detect(frames[0][1])  # warm-up
+            start = time.perf_counter()
+            predictions = {index: detector.detect(frame) for index, frame in frames}
+            line = f"{name:12s} {size:5d} {len(frames) / (time.perf_counter() - start):7.1f}"
+            if truth:
+                aps = [average_precision(predictions, truth, label) for label in PROCTORING_CLASSES]
+                present = [ap for ap in aps if ap is not None]
+                line += f" {np.mean(present) if present else float('nan'):7.3f} "
+                line += " ".join(f"{'-' if ap is None else format(ap, '.3f'):>10s}" for ap in aps)
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
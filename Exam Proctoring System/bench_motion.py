@@ -0,0 +1,190 @@
+"""Per-frame cost and agreement of the motion engine configurations.
+
+    python bench_motion.py clip1.mp4 clip2.mp4 --roi 100 50 440 400
+    python bench_motion.py --sweep --sizes 60 140 260 --speeds 4 12 40
+
+Runs the original full-resolution frame differencing and each
+MotionEngine configuration over recorded clips. For every configuration
+it reports the time per frame and how well it agrees with the original
+on which frames contain motion (agreement, precision and recall with
+the original as reference) and where (mean IoU of the motion area on
+frames both flag).
+
+--sweep does the same on generated clips of a square moving over a
+textured background, for every object size, speed and contrast, and
+reports the mean and worst agreement of each configuration.
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from motion_detection.motion_engine import MotionEngine
+
+CONFIGS = [
+    ('diff x1.0', dict(scale=1.0)),
+    ('diff x0.5', dict(scale=0.5)),
+    ('diff x0.25', dict(scale=0.25)),
+    ('mog2 x0.5', dict(scale=0.5, method='mog2')),
+    ('knn x0.5', dict(scale=0.5, method='knn')),
+]
+
+
+class LegacyMotion:
+    """MotionDetector.detect_motion as it was, without the drawing."""
+
+    def __init__(self):
+        self.prev_frame = None
+
+    def detect(self, frame):
+        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        gray_frame = cv2.GaussianBlur(gray_frame, (21, 21), 0)
+        if self.prev_frame is None:
+            self.prev_frame = gray_frame
+            return []
+        diff_frame = cv2.absdiff(self.prev_frame, gray_frame)
+        self.prev_frame = gray_frame
+        thresh_frame = cv2.threshold(diff_frame, 30, 255, cv2.THRESH_BINARY)[1]
+        thresh_frame = cv2.dilate(thresh_frame, None, iterations=2)
+        contours, _ = cv2.findContours(thresh_frame.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        return [cv2.boundingRect(c) for c in contours if cv2.contourArea(c) >= 5000]
+
+
+def read_clip(path, limit):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def synthetic_clip(size, speed, contrast, length=80, shape=(480, 640)):
+    """A size x size square moving `speed` px per frame, then still, 20 frames each in turn.
+
+    The square is `contrast` grey levels darker than the blurred noise
+    background, and every frame gets a little sensor noise.
+    """
+    rng = np.random.default_rng(0)
+    background = cv2.GaussianBlur(rng.integers(100, 180, shape + (3,), dtype=np.uint8), (0, 0), 4)
+    x, dx, top = 40, speed, (shape[0] - size) // 2
+    frames = []
+    for i in range(length):
+        if (i // 20) % 2 == 0:
+            if not 0 <= x + dx <= shape[1] - size:
+                dx = -dx
+            x += dx
+        frame = background.copy()
+        frame[top:top + size, x:x + size] = 140 - contrast
+        frames.append(cv2.add(frame, rng.integers(0, 5, frame.shape, dtype=np.uint8)))
+    return frames
+
+
+def sweep(configs, sizes, speeds, contrasts):
+    """Agreement of each configuration with the original on every synthetic clip."""
+    scores = {name: [] for name, _ in configs}
+    times = {name: [] for name, _ in configs}
+    for size in sizes:
+        for speed in speeds:
+            for contrast in contrasts:
+                # One clip at a time: the whole grid does not fit in memory
+                frames = synthetic_clip(size, speed, contrast)
+                _, reference = run(LegacyMotion(), frames)
+                for name, params in configs:
+                    ms, results = run(MotionEngine(**params), frames)
+                    agreement = compare(reference, results, frames[0].shape[:2])['agreement']
+                    scores[name].append((agreement, (size, speed, contrast)))
+                    times[name].append(ms)
+
+    print(f"{len(sizes) * len(speeds) * len(contrasts)} clips: sizes {sizes}, speeds {speeds}, "
+          f"contrasts {contrasts}")
+    print(f"  {'config':16s} {'ms/frame':>9s} {'mean':>6s} {'worst':>6s} {'<0.95':>6s}  worst clip (size, speed, contrast)")
+    for name, _ in configs:
+        agreements = np.array([agreement for agreement, _ in scores[name]])
+        worst, clip = min(scores[name])
+        print(f"  {name:16s} {np.mean(times[name]):9.2f} {agreements.mean():6.3f} {worst:6.3f} "
+              f"{(agreements < 0.95).sum():6d}  {clip}")
+
+
+def run(engine, frames):
+    start = time.perf_counter()
+    results = [engine.detect(frame) for frame in frames]
+    return (time.perf_counter() - start) / len(frames) * 1e3, results
+
+
+def union_mask(boxes, shape):
+    mask = np.zeros(shape, dtype=bool)
+    for x, y, w, h in boxes:
+        mask[max(y, 0):y + h, max(x, 0):x + w] = True
+    return mask
+
+
+def compare(reference, results, shape):
+    expected = np.array([bool(boxes) for boxes in reference])
+    found = np.array([bool(boxes) for boxes in results])
+    both = expected & found
+    ious = []
+    for ref_boxes, boxes in zip(np.array(reference, dtype=object)[both], np.array(results, dtype=object)[both]):
+        a, b = union_mask(ref_boxes, shape), union_mask(boxes, shape)
+        ious.append((a & b).sum() / max((a | b).sum(), 1))
+    return {
+        'agreement': float((expected == found).mean()),
+        'precision': float(both.sum() / found.sum()) if found.any() else float('nan'),
+        'recall': float(both.sum() / expected.sum()) if expected.any() else float('nan'),
+        'iou': float(np.mean(ious)) if ious else float('nan'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark motion detection configurations.")
+    parser.add_argument('clips', nargs='*', help="Recorded video files")
+    parser.add_argument('--roi', type=int, nargs=4, metavar=('X', 'Y', 'W', 'H'),
+                        help="Also test each configuration restricted to this seat area")
+    parser.add_argument('--limit', type=int, default=1000, help="Most frames read per clip")
+    parser.add_argument('--sweep', action='store_true', help="Also compare on generated clips")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[60, 100, 140, 180, 220, 260],
+                        help="Side of the moving square in --sweep clips, in pixels")
+    parser.add_argument('--speeds', type=int, nargs='+', default=[4, 8, 12, 18, 24, 32, 40],
+                        help="Speeds of the square in --sweep clips, in pixels per frame")
+    parser.add_argument('--contrasts', type=int, nargs='+', default=[50, 80, 120],
+                        help="Grey levels between the square and the background in --sweep clips")
+    args = parser.parse_args()
+    if not args.clips and not args.sweep:
+        parser.error("give recorded clips and/or --sweep")
+
+    configs = list(CONFIGS)
+    if args.roi:
+        configs += [(f"{name} roi", dict(params, roi=tuple(args.roi))) for name, params in CONFIGS]
+
+    for clip in args.clips:
+        frames = read_clip(clip, args.limit)
+        if not frames:
+            print(f"{clip}: no frames")
+            continue
+        shape = frames[0].shape[:2]
+        legacy_ms, reference = run(LegacyMotion(), frames)
+        if args.roi:
+            # Judge ROI configurations only on motion inside the seat area
+            roi_mask = union_mask([tuple(args.roi)], shape)
+        print(f"{clip}: {len(frames)} frames {shape[1]}x{shape[0]}, "
+              f"original {legacy_ms:.2f} ms/frame, motion in {sum(map(bool, reference))} frames")
+        print(f"  {'config':16s} {'ms/frame':>9s} {'speedup':>8s} {'agree':>6s} {'prec':>6s} {'recall':>6s} {'IoU':>6s}")
+        for name, params in configs:
+            ms, results = run(MotionEngine(**params), frames)
+            expected = reference
+            if 'roi' in params:
+                expected = [[b for b in boxes if (union_mask([b], shape) & roi_mask).any()] for boxes in reference]
+            scores = compare(expected, results, shape)
+            print(f"  {name:16s} {ms:9.2f} {legacy_ms / ms:7.1f}x {scores['agreement']:6.3f} "
+                  f"{scores['precision']:6.3f} {scores['recall']:6.3f} {scores['iou']:6.3f}")
+
+    if args.sweep:
+        sweep(CONFIGS, args.sizes, args.speeds, args.contrasts)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Per-frame time of the YOLO output decode step.
+
+    python bench_yolo_decode.py --size 416 --frames 200
+
+Generates output layers with YOLOv4's shapes (three scales, three
+anchors each) and times the original per-row Python loop against
+yolo.decode_outputs, checking that both return the same detections. No
+weights or camera are needed.
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from motion_detection.yolo import decode_outputs
+
+
+def legacy_decode(outputs, width, height):
+    """The per-detection loop MotionDetector used before decode_outputs."""
+    boxes = []
+    confidences = []
+    class_ids = []
+
+    for output in outputs:
+        for detection in output:
+            scores = detection[5:]
+            class_id = np.argmax(scores)
+            confidence = scores[class_id]
+            if confidence > 0.5:  # Confidence threshold
+                center_x = int(detection[0] * width)
+                center_y = int(detection[1] * height)
+                w = int(detection[2] * width)
+                h = int(detection[3] * height)
+                x = int(center_x - w / 2)
+                y = int(center_y - h / 2)
+
+                boxes.append([x, y, w, h])
+                confidences.append(float(confidence))
+                class_ids.append(class_id)
+
+    indexes = cv2.dnn.NMSBoxes(boxes, confidences, 0.5, 0.4)
+    return [(int(class_ids[i]), confidences[i], tuple(boxes[i])) for i in np.asarray(indexes, dtype=int).reshape(-1)]
+
+
+def fake_outputs(rng, size, classes=80, detections=5):
+    """Output layers for a `size` x `size` input with a few confident boxes."""
+    outputs = []
+    for stride in (32, 16, 8):
+        cells = (size // stride) ** 2 * 3
+        output = np.zeros((cells, 5 + classes), dtype=np.float32)
+        output[:, :4] = rng.random((cells, 4), dtype=np.float32)
+        output[:, 5:] = rng.random((cells, classes), dtype=np.float32) * 0.2
+        outputs.append(output)
+    for _ in range(detections):
+        output = outputs[rng.integers(len(outputs))]
+        output[rng.integers(len(output)), 5 + rng.integers(classes)] = 0.6 + 0.4 * rng.random()
+    return outputs
+
+
+def time_decode(decode, frames, width, height):
+    start = time.perf_counter()
+    results = [decode(outputs, width, height) for outputs in frames]
+    return (time.perf_counter() - start) / len(frames) * 1e3, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark YOLO output decoding.")
+    parser.add_argument('--size', type=int, default=416, help="Network input size")
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frames = [fake_outputs(rng, args.size) for _ in range(args.frames)]
+    frames.append(fake_outputs(rng, args.size, detections=0))  # nothing detected
+
+    legacy_ms, legacy = time_decode(legacy_decode, frames, args.width, args.height)
+    vectorised_ms, vectorised = time_decode(decode_outputs, frames, args.width, args.height)
+    assert legacy == vectorised, "decoders disagree"
+
+    rows = sum(len(output) for output in frames[0])
+    print(f"{rows} rows per frame at {args.size}x{args.size}, {len(frames)} frames")
+    print(f"loop       {legacy_ms:8.3f} ms/frame")
+    print(f"vectorised {vectorised_ms:8.3f} ms/frame ({legacy_ms / vectorised_ms:.0f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+import queue
+import threading
+import time
+from collections import defaultdict
+
+import cv2
+import numpy as np
+
+from .pipeline import FrameQueue
+
+# Passed to viewers when the source ends
+_END = object()
+
+
+class Viewer:
+    """One client of a FrameBroadcaster.
+
+    Holds only the newest encoded frame: a client on a slow connection
+    skips frames instead of delaying the others or buffering stale video.
+
+    :param quality: JPEG quality, 10-95.
+    :param width: output width in pixels (height keeps the aspect ratio);
+        None for the source size.
+    :param delta: only send frames that differ visibly from the last one
+        sent, plus one every `keepalive` seconds.
+    """
+
+    def __init__(self, quality=80, width=None, delta=False, keepalive=5.0):
+        self.quality = int(min(max(quality, 10), 95))
+        self.width = None if not width else max(int(width), 64)
+        self.delta = delta
+        self.keepalive = keepalive
+        self.frames = FrameQueue(maxsize=1)
+        self.sent = 0
+        self.skipped = 0
+        self.last_signature = None
+        self.last_sent = 0.0
+
+    @property
+    def profile(self):
+        return self.quality, self.width
+
+    def wants(self, signature, now, threshold):
+        """Whether the frame with this signature should go to this viewer."""
+        if not self.delta or self.last_signature is None or now - self.last_sent >= self.keepalive:
+            return True
+        return float(np.mean(cv2.absdiff(signature, self.last_signature))) > threshold
+
+
+class FrameBroadcaster:
+    """Encodes each annotated frame once and fans it out to every viewer.
+
+    The source (capture, motion detection, YOLO, ...) runs on one thread
+    while at least one viewer is subscribed, however many browsers are
+    watching, and is closed when the last one leaves. Frames are resized
+    and JPEG-encoded once per distinct (quality, width) among the viewers
+    that want them.
+
+    :param open_frames: callable returning an iterator of annotated BGR
+        frames; closed (if it is a generator) when nobody is watching.
+    :param delta_threshold: mean absolute difference (0-255) of a 32x24
+        grey thumbnail below which a delta viewer's frame counts as unchanged.
+    """
+
+    SIGNATURE_SIZE = (32, 24)
+
+    def __init__(self, open_frames, delta_threshold=1.5):
+        self.open_frames = open_frames
+        self.delta_threshold = delta_threshold
+        self.frames = 0
+        self.encodes = defaultdict(int)  # (quality, width) -> frames encoded
+        self._viewers = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+        self._generation = 0  # bumped for every broadcast thread started
+
+    def subscribe(self, quality=80, width=None, delta=False):
+        viewer = Viewer(quality, width, delta)
+        with self._lock:
+            self._viewers.append(viewer)
+            if not self._running:
+                # The previous source may still be closing; the new thread waits for it
+                self._running = True
+                self._generation += 1
+                self._thread = threading.Thread(target=self._broadcast, args=(self._thread, self._generation),
+                                                daemon=True)
+                self._thread.start()
+        return viewer
+
+    def unsubscribe(self, viewer):
+        with self._lock:
+            if viewer in self._viewers:
+                self._viewers.remove(viewer)
+
+    def stream(self, quality=80, width=None, delta=False):
+        """multipart/x-mixed-replace body for one client."""
+        viewer = self.subscribe(quality, width, delta)
+        try:
+            while True:
+                try:
+                    jpeg = viewer.frames.get(timeout=1.0)
+                except queue.Empty:
+                    continue
+                if jpeg is _END:
+                    return
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+        finally:
+            self.unsubscribe(viewer)
+
+    def stats(self):
+        with self._lock:
+            viewers = list(self._viewers)
+            encodes = {f"q{quality}_w{width or 'full'}": count for (quality, width), count in self.encodes.items()}
+        return {
+            'running': self._running,
+            'frames': self.frames,
+            'encodes': encodes,
+            'viewers': [{'quality': viewer.quality, 'width': viewer.width, 'delta': viewer.delta,
+                         'sent': viewer.sent, 'skipped': viewer.skipped, 'dropped': viewer.frames.dropped}
+                        for viewer in viewers],
+        }
+
+    def _broadcast(self, previous, generation):
+        if previous is not None:
+            previous.join()
+        frames = self.open_frames()
+        try:
+            for frame in frames:
+                with self._lock:
+                    viewers = list(self._viewers)
+                    if not viewers:
+                        self._running = False
+                        return
+                self._send(frame, viewers)
+        finally:
+            close = getattr(frames, 'close', None)
+            if close is not None:
+                close()
+            with self._lock:
+                # Once a newer thread has started, the viewers and the running flag are its own
+                current = generation == self._generation
+                ended = current and self._running  # the source ran out while people were watching
+                if current:
+                    self._running = False
+                viewers = list(self._viewers) if ended else []
+            for viewer in viewers:
+                viewer.frames.put(_END)
+
+    def _send(self, frame, viewers):
+        self.frames += 1
+        now = time.monotonic()
+        signature = None
+        if any(viewer.delta for viewer in viewers):
+            small = cv2.resize(frame, self.SIGNATURE_SIZE, interpolation=cv2.INTER_AREA)
+            signature = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+        recipients = defaultdict(list)
+        for viewer in viewers:
+            if viewer.delta and not viewer.wants(signature, now, self.delta_threshold):
+                viewer.skipped += 1
+                continue
+            recipients[viewer.profile].append(viewer)
+
+        resized = {}
+        for (quality, width), group in recipients.items():
+            if width not in resized:
+                resized[width] = self._resize(frame, width)
+            _, buffer = cv2.imencode('.jpg', resized[width], [cv2.IMWRITE_JPEG_QUALITY, quality])
+            jpeg = buffer.tobytes()
+            with self._lock:
+                self.encodes[quality, width] += 1
+            for viewer in group:
+                viewer.frames.put(jpeg)
+                viewer.sent += 1
+                viewer.last_sent = now
+                viewer.last_signature = signature
+
+    @staticmethod
+    def _resize(frame, width):
+        height, frame_width = frame.shape[:2]
+        if width is None or width >= frame_width:
+            return frame
+        return cv2.resize(frame, (width, round(height * width / frame_width)), interpolation=cv2.INTER_AREA)
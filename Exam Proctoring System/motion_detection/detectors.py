@@ -0,0 +1,123 @@
+import abc
+
+import cv2
+import numpy as np
+
+from .yolo import decode_outputs
+
+# What a proctor needs to see: other people, phones and books
+PROCTORING_CLASSES = ('person', 'cell phone', 'book')
+
+
+def load_class_names(path='coco.names'):
+    """Class labels in the order of the network's class scores."""
+    with open(path, 'r') as f:
+        return f.read().strip().split('\n')
+
+
+class ObjectDetector(abc.ABC):
+    """Base class of the YOLO-style object detectors.
+
+    Subclasses implement `forward(blob)`, returning the raw output layers
+    for a preprocessed N x 3 x S x S blob; decoding, the class filter and
+    NMS are shared.
+
+    :param input_size: side S of the square network input. Smaller inputs
+        (320, 256) run much faster on CPU at some cost in accuracy.
+    :param classes: class names to report, or None for every class.
+    :param class_names: file with the class labels, one per line.
+    :param conf_threshold: minimum class score of a detection.
+    :param nms_threshold: IoU above which overlapping boxes are merged.
+    """
+
+    def __init__(self, input_size=416, classes=PROCTORING_CLASSES, class_names='coco.names',
+                 conf_threshold=0.5, nms_threshold=0.4):
+        self.input_size = input_size
+        self.class_names = load_class_names(class_names)
+        self.class_filter = None if classes is None else np.array([self.class_names.index(c) for c in classes])
+        self.conf_threshold = conf_threshold
+        self.nms_threshold = nms_threshold
+
+    def detect(self, frame):
+        """Detections on a BGR frame as a list of (label, confidence, (x, y, w, h))."""
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames):
+        """detect() for several frames with a single forward pass."""
+        size = (self.input_size, self.input_size)
+        blob = cv2.dnn.blobFromImages(frames, 1 / 255.0, size, swapRB=True, crop=False)
+        outputs = [output.reshape(len(frames), -1, output.shape[-1]) for output in self.forward(blob)]
+        results = []
+        for i, frame in enumerate(frames):
+            height, width = frame.shape[:2]
+            detections = decode_outputs([output[i] for output in outputs], width, height,
+                                        self.conf_threshold, self.nms_threshold, self.class_filter)
+            results.append([(self.class_names[class_id], confidence, box)
+                            for class_id, confidence, box in detections])
+        return results
+
+    @abc.abstractmethod
+    def forward(self, blob):
+        """Raw output layers of the network for a preprocessed blob."""
+
+
+class DarknetDetector(ObjectDetector):
+    """Darknet YOLO (yolov4, yolov4-tiny, ...) run with OpenCV's DNN module.
+
+    :param backend, target: cv2.dnn backend / target, e.g.
+        DNN_BACKEND_INFERENCE_ENGINE where OpenVINO is available.
+    """
+
+    def __init__(self, weights='yolov4.weights', cfg='yolov4.cfg', backend=cv2.dnn.DNN_BACKEND_OPENCV,
+                 target=cv2.dnn.DNN_TARGET_CPU, **kwargs):
+        super().__init__(**kwargs)
+        self.net = cv2.dnn.readNet(weights, cfg)
+        self.net.setPreferableBackend(backend)
+        self.net.setPreferableTarget(target)
+        self.output_layers = self.net.getUnconnectedOutLayersNames()
+
+    def forward(self, blob):
+        self.net.setInput(blob)
+        return self.net.forward(self.output_layers)
+
+
+class OnnxDetector(ObjectDetector):
+    """YOLO exported to ONNX, run with onnxruntime.
+
+    The model takes an N x 3 x S x S RGB input scaled to [0, 1] and its
+    outputs use the Darknet row layout (cx, cy, w, h, objectness, class
+    scores) relative to the input, as written by OpenCV's Darknet importer.
+
+    :param threads: onnxruntime intra-op threads, 0 for its default.
+    """
+
+    def __init__(self, model='yolov4.onnx', providers=('CPUExecutionProvider',), threads=0, **kwargs):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError("OnnxDetector needs onnxruntime: pip install onnxruntime")
+        super().__init__(**kwargs)
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(model, options, providers=list(providers))
+        self.input_name = self.session.get_inputs()[0].name
+
+    def forward(self, blob):
+        return self.session.run(None, {self.input_name: blob})
+
+
+# Named detector configurations; model files are looked up in the working directory
+DETECTORS = {
+    'yolov4': (DarknetDetector, {'weights': 'yolov4.weights', 'cfg': 'yolov4.cfg'}),
+    'yolov4-tiny': (DarknetDetector, {'weights': 'yolov4-tiny.weights', 'cfg': 'yolov4-tiny.cfg'}),
+    'onnx': (OnnxDetector, {'model': 'yolov4.onnx'}),
+}
+
+
+def create_detector(name='yolov4', **kwargs):
+    """Build one of DETECTORS; keyword arguments override its defaults."""
+    try:
+        cls, defaults = DETECTORS[name]
+    except KeyError:
+        raise ValueError(f"Unknown detector {name!r}, choose from {', '.join(DETECTORS)}")
+    return cls(**{**defaults, **kwargs})
@@ -0,0 +1,124 @@
+import queue
+import threading
+import time
+
+from .pipeline import FrameQueue
+from .snapshot_store import SnapshotStore
+
+try:
+    import winsound  # For sound notification, Windows only
+except ImportError:
+    winsound = None
+
+
+class Subscription:
+    """Events of the given kinds, buffered for one consumer.
+
+    The buffer is a FrameQueue, so a consumer that falls behind loses
+    the oldest events instead of slowing down the publisher.
+    """
+
+    def __init__(self, kinds=None, maxsize=64):
+        self.kinds = None if kinds is None else frozenset(kinds)
+        self.events = FrameQueue(maxsize)
+
+    def wants(self, kind):
+        return self.kinds is None or kind in self.kinds
+
+    def get(self, timeout=None):
+        """Next event; raises queue.Empty after `timeout` seconds."""
+        return self.events.get(timeout)
+
+
+class EventBus:
+    """Hands side effects of the frame loop to background consumers.
+
+    `publish` never blocks: it puts the event on the queue of every
+    matching subscription and returns. Handlers added with `add_handler`
+    run on their own thread each, so a slow one (a one second beep) does
+    not hold up the others; Server-Sent Event streams consume a
+    Subscription directly.
+
+    Events are dicts with 'type', 'time' and the keyword arguments given
+    to `publish`.
+    """
+
+    def __init__(self):
+        self._subscriptions = []
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._threads = []
+
+    def publish(self, kind, **data):
+        event = dict(data, type=kind, time=time.time())
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if subscription.wants(kind):
+                subscription.events.put(event)
+
+    def subscribe(self, kinds=None, maxsize=64):
+        subscription = Subscription(kinds, maxsize)
+        with self._lock:
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def add_handler(self, handler, kinds=None, maxsize=64):
+        """Call `handler(event)` on a background thread for each matching event."""
+        subscription = self.subscribe(kinds, maxsize)
+        thread = threading.Thread(target=self._handle, args=(subscription, handler), daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def close(self):
+        self._closed.set()
+        for thread in self._threads:
+            thread.join()
+
+    def _handle(self, subscription, handler):
+        while not self._closed.is_set():
+            try:
+                event = subscription.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            try:
+                handler(event)
+            except Exception as e:
+                print(f"Error handling {event['type']} event: {e}")
+
+
+def sound_alarm(event):
+    """Plays a beep for an 'alarm' event (Windows only, silent elsewhere)."""
+    if winsound is not None:
+        winsound.Beep(1000, 1000)  # Frequency: 1000 Hz, Duration: 1000 ms (1 second)
+
+
+class SnapshotWriter:
+    """Adds 'snapshot' events to a SnapshotStore and announces them as 'snapshot_saved'."""
+
+    def __init__(self, bus, store):
+        self.bus = bus
+        self.store = store
+
+    def __call__(self, event):
+        record = self.store.add(event['frame'], session=event['source'], reason=event['reason'],
+                                timestamp=event['time'])
+        self.bus.publish('snapshot_saved', source=event['source'], id=record['id'], path=record['path'],
+                         thumbnail=record['thumbnail'], reason=record['reason'])
+
+
+def create_event_bus(store=None):
+    """An EventBus with the alarm sound and snapshot writer attached.
+
+    :param store: snapshot_store.SnapshotStore for the snapshots; None for
+        one in static/snapshots.
+    """
+    bus = EventBus()
+    bus.add_handler(sound_alarm, kinds=('alarm',))
+    bus.add_handler(SnapshotWriter(bus, SnapshotStore() if store is None else store), kinds=('snapshot',))
+    return bus
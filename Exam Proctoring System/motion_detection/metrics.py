@@ -0,0 +1,53 @@
+import bisect
+import threading
+
+# Bucket upper bounds in milliseconds, roughly 25% apart from 0.05 ms to ~50 s
+BUCKETS_MS = [0.05 * 1.25 ** i for i in range(63)]
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram; memory stays constant however long it runs."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        ms = seconds * 1e3
+        with self._lock:
+            self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+            self.count += 1
+            self.total += ms
+            self.max = max(self.max, ms)
+
+    def percentile(self, q):
+        """Upper bound (ms) of the bucket holding the q-th percentile."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = q / 100 * self.count
+            seen = 0
+            for bucket, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank and count:
+                    return min(BUCKETS_MS[bucket], self.max) if bucket < len(BUCKETS_MS) else self.max
+            return self.max
+
+    def summary(self):
+        """Count, mean, p50/p90/p99, max (ms) and the non-empty buckets."""
+        with self._lock:
+            count, total, largest = self.count, self.total, self.max
+            buckets = {f"{BUCKETS_MS[i]:.3g}" if i < len(BUCKETS_MS) else "inf": c
+                       for i, c in enumerate(self.counts) if c}
+        return {
+            'count': count,
+            'mean_ms': total / count if count else 0.0,
+            'p50_ms': self.percentile(50),
+            'p90_ms': self.percentile(90),
+            'p99_ms': self.percentile(99),
+            'max_ms': largest,
+            'buckets_le_ms': buckets,
+        }
@@ -1,63 +1,73 @@
 import cv2
 import time
-import winsound  # For sound notification
-import requests  # For sending request to trigger the alert
-from deepface import DeepFace  # For emotion detection (requires installation)
-import numpy as np  # For object detection
+try:
+    from deepface import DeepFace  # For emotion detection (requires installation)
+except ImportError:
+    DeepFace = None  # emotion detection disabled, e.g. on headless benchmark machines
+
+from .broadcast import FrameBroadcaster
+from .pipeline import FramePipeline
+from .scheduler import InferenceScheduler
+from .detectors import create_detector
+from .events import create_event_bus
+from .motion_engine import MotionEngine
+from .sources import open_source
 
 class MotionDetector:
-    def __init__(self, motion_threshold=5, reset_interval=5):
+    def __init__(self, motion_threshold=5, reset_interval=5, schedule=None, object_detector=None, source=0,
+                 events=None, name=None, snapshot_interval=2.0, snapshot_after=2, motion_engine=None):
         """
         Initialize the Motion Detector with motion and object detection capabilities.
         :param motion_threshold: Maximum allowed movements before triggering the alarm.
         :param reset_interval: Time interval in seconds to reset the motion count.
+        :param schedule: dict of detector name ('objects', 'emotion') -> scheduler.Rule
+            saying how often YOLO and DeepFace run; None for scheduler.DEFAULT_SCHEDULE.
+        :param object_detector: a detectors.ObjectDetector; None for full YOLOv4 at 416x416,
+            loaded on first use.
+        :param source: camera index, video file, stream URL or directory of frames to
+            capture from, or None when frames are handed to detect_motion by the caller.
+        :param events: events.EventBus receiving 'alarm' and 'snapshot' events; None for
+            a private bus from events.create_event_bus.
+        :param name: identifies this stream in events and snapshots.
+        :param snapshot_interval: minimum seconds between two snapshots.
+        :param snapshot_after: consecutive motion frames needed before a snapshot.
+        :param motion_engine: a motion_engine.MotionEngine (downscale, method, seat ROI);
+            None for frame differencing at half the resolution.
         """
-        self.cap = cv2.VideoCapture(0)
-        self.prev_frame = None
+        self.cap = None if source is None else open_source(source)
+        self.motion_engine = MotionEngine() if motion_engine is None else motion_engine
         self.motion_count = 0
         self.motion_threshold = motion_threshold
         self.reset_interval = reset_interval
         self.last_reset_time = time.time()
         self.alarm_triggered = False
-        self.object_classes = None  # Store YOLO class labels
-
-        # Load YOLO model for object detection
-        self.net = cv2.dnn.readNet('yolov4.weights', 'yolov4.cfg')  # Use YOLOv4 weights and cfg
-        self.layer_names = self.net.getLayerNames()
-        self.output_layers = [self.layer_names[i - 1] for i in self.net.getUnconnectedOutLayers()]
-        self.load_class_labels()
-
-    def load_class_labels(self):
-        """Load the class labels YOLO can detect."""
-        with open('coco.names', 'r') as f:
-            self.object_classes = f.read().strip().split('\n')
+        self.motion_streak = 0
+        self.name = name
+        self.events = create_event_bus() if events is None else events
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_after = snapshot_after
+        self.last_snapshot_time = 0.0
+        self.scheduler = InferenceScheduler(schedule)
+
+        # YOLO model for object detection
+        self._object_detector = object_detector
+        # Shared by every client of get_video_stream
+        self.broadcaster = FrameBroadcaster(self.annotated_frames)
+
+    @property
+    def object_detector(self):
+        if self._object_detector is None:
+            self._object_detector = create_detector('yolov4')
+        return self._object_detector
 
     def detect_motion(self, frame):
-        # Preprocess the frame
-        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        gray_frame = cv2.GaussianBlur(gray_frame, (21, 21), 0)
-
-        if self.prev_frame is None:
-            self.prev_frame = gray_frame
-            return frame, False
-
-        # Calculate frame differences
-        diff_frame = cv2.absdiff(self.prev_frame, gray_frame)
-        self.prev_frame = gray_frame
-
-        # Threshold and find contours
-        thresh_frame = cv2.threshold(diff_frame, 30, 255, cv2.THRESH_BINARY)[1]
-        thresh_frame = cv2.dilate(thresh_frame, None, iterations=2)
-        contours, _ = cv2.findContours(thresh_frame.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-        motion_detected = False
-        for contour in contours:
-            if cv2.contourArea(contour) < 5000:
-                continue
-            motion_detected = True
-            (x, y, w, h) = cv2.boundingRect(contour)
+        """Find moving regions with the motion engine and outline them on the frame."""
+        boxes = self.motion_engine.detect(frame)
+        for (x, y, w, h) in boxes:
             cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 3)
+        motion_detected = bool(boxes)
 
+        self.motion_streak = self.motion_streak + 1 if motion_detected else 0
         if motion_detected:
             self.update_motion_count()
 
@@ -65,6 +75,8 @@ class MotionDetector:
 
     def detect_emotion(self, frame):
         """Detect emotion using DeepFace."""
+        if DeepFace is None:
+            return None
         try:
             result = DeepFace.analyze(frame, actions=['emotion'], enforce_detection=False)
             emotion = result[0]['dominant_emotion']
@@ -75,40 +87,22 @@ class MotionDetector:
 
     def detect_objects(self, frame):
         """Detect objects using YOLO."""
-        height, width = frame.shape[:2]
-        blob = cv2.dnn.blobFromImage(frame, 1 / 255.0, (416, 416), swapRB=True, crop=False)
-        self.net.setInput(blob)
-        outputs = self.net.forward(self.output_layers)
-
-        boxes = []
-        confidences = []
-        class_ids = []
-
-        for output in outputs:
-            for detection in output:
-                scores = detection[5:]
-                class_id = np.argmax(scores)
-                confidence = scores[class_id]
-                if confidence > 0.5:  # Confidence threshold
-                    center_x = int(detection[0] * width)
-                    center_y = int(detection[1] * height)
-                    w = int(detection[2] * width)
-                    h = int(detection[3] * height)
-                    x = int(center_x - w / 2)
-                    y = int(center_y - h / 2)
-
-                    boxes.append([x, y, w, h])
-                    confidences.append(float(confidence))
-                    class_ids.append(class_id)
-
-        indexes = cv2.dnn.NMSBoxes(boxes, confidences, 0.5, 0.4)  # Non-Maximum Suppression
-        for i in indexes.flatten():
-            x, y, w, h = boxes[i]
-            label = str(self.object_classes[class_ids[i]])
-            confidence = confidences[i]
+        return self.draw_objects(frame, self.find_objects(frame))
+
+    def find_objects(self, frame):
+        """Run YOLO on a frame; returns a list of (label, confidence, (x, y, w, h))."""
+        return self.object_detector.detect(frame)
+
+    def draw_objects(self, frame, objects):
+        """Draw the boxes returned by find_objects."""
+        for label, confidence, (x, y, w, h) in objects:
             cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
             cv2.putText(frame, f"{label} ({confidence:.2f})", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 2)
+        return frame
 
+    def draw_emotion(self, frame, emotion):
+        if emotion:
+            cv2.putText(frame, f"Emotion: {emotion}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
         return frame
 
     def update_motion_count(self):
@@ -127,50 +121,51 @@ class MotionDetector:
         # Trigger alarm if motion count exceeds threshold and alarm hasn't been triggered
         if self.motion_count > self.motion_threshold and not self.alarm_triggered:
             self.trigger_alarm()
-            self.trigger_web_alert()  # Trigger the alert on the web interface
             self.alarm_triggered = True  # Set the flag to prevent multiple triggers
 
     def trigger_alarm(self):
-        """Plays a beep sound when motion count exceeds the threshold."""
-        winsound.Beep(1000, 1000)  # Frequency: 1000 Hz, Duration: 1000 ms (1 second)
-
-    def trigger_web_alert(self):
-        """Send request to trigger alert on web dashboard."""
-        try:
-            # Make a request to trigger the alert in the dashboard
-            requests.get('http://localhost:5000/trigger_alert')
-        except Exception as e:
-            print(f"Error triggering web alert: {e}")
+        """Publish an 'alarm' event; the beep and the web alert are handled off the frame loop."""
+        self.events.publish('alarm', source=self.name, motion_count=self.motion_count)
 
     def save_snapshot(self, frame):
-        """Save snapshot when motion is detected."""
-        timestamp = time.strftime("%Y%m%d-%H%M%S")
-        filepath = f'static/snapshots/snapshot_{timestamp}.jpg'
-        cv2.imwrite(filepath, frame)
-
-    def get_video_stream(self):
-        """Continuously capture video stream."""
-        while True:
-            ret, frame = self.cap.read()
-            if not ret:
-                break
-
-            frame, motion_detected = self.detect_motion(frame)
-            if motion_detected:
-                self.save_snapshot(frame)
-
-            emotion = self.detect_emotion(frame)
-            if emotion:
-                cv2.putText(frame, f"Emotion: {emotion}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+        """Queue a snapshot of a motion frame for the background writer.
 
-            frame = self.detect_objects(frame)
+        Motion must have lasted `snapshot_after` frames, and snapshots are
+        at least `snapshot_interval` seconds apart. Returns whether one was
+        queued.
+        """
+        now = time.time()
+        if (self.motion_streak < self.snapshot_after
+                or now - self.last_snapshot_time < self.snapshot_interval):
+            return False
+        self.last_snapshot_time = now
+        self.events.publish('snapshot', source=self.name, reason='motion', frame=frame.copy())
+        return True
+
+    def annotated_frames(self):
+        """Annotated frames from the camera.
+
+        Capture, motion detection and heavy analysis run in separate
+        threads (see pipeline.FramePipeline), so the stream keeps
+        the camera's frame rate while YOLO and DeepFace catch up on the
+        latest frame.
+        """
+        pipeline = FramePipeline(self, encode=False)
+        pipeline.start()
+        try:
+            yield from pipeline.frames()
+        finally:
+            pipeline.stop()
 
-            _, buffer = cv2.imencode('.jpg', frame)
-            frame = buffer.tobytes()
+    def get_video_stream(self, quality=80, width=None, delta=False):
+        """Continuously capture video stream.
 
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+        All clients share one capture and analysis pipeline through
+        `broadcaster`; see broadcast.Viewer for the options.
+        """
+        return self.broadcaster.stream(quality, width, delta)
 
     def release(self):
         """Release the video capture."""
-        self.cap.release()
+        if self.cap is not None:
+            self.cap.release()
@@ -0,0 +1,211 @@
+import queue
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from .metrics import LatencyHistogram
+
+
+class FrameQueue:
+    """Bounded queue between pipeline stages.
+
+    By default it drops the oldest frame when full, so a slow consumer
+    always gets the freshest frames instead of falling further and
+    further behind the camera. With `drop=False` producers wait for room
+    instead, which replays use to process every frame.
+    """
+
+    def __init__(self, maxsize=2, drop=True):
+        self.maxsize = maxsize
+        self.drop = drop
+        self._items = deque()
+        self._ready = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item, timeout=None):
+        """Queue an item; False if a non-dropping queue stayed full for `timeout` seconds."""
+        with self._ready:
+            if len(self._items) >= self.maxsize:
+                if self.drop:
+                    self._items.popleft()
+                    self.dropped += 1
+                elif not self._ready.wait_for(lambda: len(self._items) < self.maxsize, timeout):
+                    return False
+            self._items.append(item)
+            self._ready.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """Oldest queued item; raises queue.Empty after `timeout` seconds."""
+        with self._ready:
+            if not self._ready.wait_for(lambda: self._items, timeout):
+                raise queue.Empty
+            item = self._items.popleft()
+            self._ready.notify_all()
+            return item
+
+
+# Passed down the stages when the source is exhausted
+_END = object()
+
+
+class FramePipeline:
+    """Runs a MotionDetector's per-frame work as concurrent stages.
+
+    capture -> motion -> encode run at the camera's frame rate, connected
+    by small FrameQueues. The motion stage asks the detector's
+    InferenceScheduler which of DeepFace and YOLO are due and hands a copy
+    of the frame to the analysis stage, which runs them on the most recent
+    such frame only; their last results are drawn on every frame until the
+    next ones are ready. OpenCV and the DNN backends release the GIL, so
+    threads are enough to overlap the stages.
+
+    When the source ends, the frames already in flight are still
+    delivered. Every stage's time per frame, and the latency from
+    capture to output, are kept in `timings` (LatencyHistograms).
+
+    :param detector: the MotionDetector providing the capture and detectors.
+    :param queue_size: frames buffered between the fast stages.
+    :param drop: drop the oldest frames under backpressure (live streams);
+        False makes every stage wait, so no frame is lost (replays).
+    :param encode: JPEG-encode the output frames; False yields the
+        annotated frames themselves.
+    """
+
+    POLL_INTERVAL = 0.1  # seconds a stage waits before rechecking for stop
+    STAGES = ('capture', 'motion', 'emotion', 'objects', 'encode', 'end_to_end')
+
+    def __init__(self, detector, queue_size=2, drop=True, encode=True):
+        self.detector = detector
+        self.encode = encode
+        self.captured = FrameQueue(queue_size, drop)
+        self.to_analyse = FrameQueue(1)
+        self.to_encode = FrameQueue(queue_size, drop)
+        self.encoded = FrameQueue(queue_size, drop)
+        self.emotion = None
+        self.objects = []
+        self.frames_out = 0
+        self.timings = {stage: LatencyHistogram() for stage in self.STAGES}
+        self._requested = set()  # detectors due but not yet run
+        self._results_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for stage in (self._capture, self._motion, self._analyse, self._encode):
+            thread = threading.Thread(target=self._run, args=(stage,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def frames(self):
+        """Yield output frames (JPEG bytes, or arrays without encode) until the source ends or stop()."""
+        for captured_at, frame in self._items(self.encoded):
+            self.timings['end_to_end'].add(time.perf_counter() - captured_at)
+            self.frames_out += 1
+            yield frame
+
+    def stats(self):
+        """Per-stage latency summaries and frames dropped between stages."""
+        return {
+            'stages': {stage: histogram.summary() for stage, histogram in self.timings.items()},
+            'dropped': {name: getattr(self, name).dropped
+                        for name in ('captured', 'to_analyse', 'to_encode', 'encoded')},
+        }
+
+    def latest_results(self):
+        """Last (emotion, objects) from the analysis stage."""
+        with self._results_lock:
+            return self.emotion, self.objects
+
+    def _run(self, stage):
+        try:
+            stage()
+        except BaseException:
+            self._stopped.set()  # a failing stage takes the pipeline down
+            raise
+
+    def _items(self, source):
+        while not self._stopped.is_set():
+            try:
+                item = source.get(timeout=self.POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            if item is _END:
+                return
+            yield item
+
+    def _put(self, target, item):
+        while not target.put(item, timeout=self.POLL_INTERVAL):
+            if self._stopped.is_set():
+                return
+
+    def _capture(self):
+        while not self._stopped.is_set():
+            start = time.perf_counter()
+            ret, frame = self.detector.cap.read()
+            if not ret:
+                break
+            self.timings['capture'].add(time.perf_counter() - start)
+            self._put(self.captured, (start, frame))
+        self._put(self.captured, _END)
+
+    def _motion(self):
+        scheduler = self.detector.scheduler
+        for captured_at, frame in self._items(self.captured):
+            start = time.perf_counter()
+            original = frame.copy()
+            frame, motion_detected = self.detector.detect_motion(frame)
+            if motion_detected:
+                self.detector.save_snapshot(frame)
+            due = scheduler.tick(motion_detected)
+            if due:
+                # A frame replaced in the queue hands its detectors on to the newer one
+                with self._results_lock:
+                    self._requested.update(due)
+                self.to_analyse.put(original)
+
+            emotion, objects = self.latest_results()
+            self.detector.draw_emotion(frame, emotion)
+            self.detector.draw_objects(frame, objects)
+            self.timings['motion'].add(time.perf_counter() - start)
+            self._put(self.to_encode, (captured_at, frame))
+        self.to_analyse.put(_END)
+        self._put(self.to_encode, _END)
+
+    def _analyse(self):
+        scheduler = self.detector.scheduler
+        for frame in self._items(self.to_analyse):
+            with self._results_lock:
+                due, self._requested = self._requested, set()
+            if 'emotion' in due:
+                start = time.perf_counter()
+                emotion = self.detector.detect_emotion(frame)
+                self.timings['emotion'].add(time.perf_counter() - start)
+                scheduler.record('emotion')
+                with self._results_lock:
+                    self.emotion = emotion
+            if 'objects' in due:
+                start = time.perf_counter()
+                objects = self.detector.find_objects(frame)
+                self.timings['objects'].add(time.perf_counter() - start)
+                scheduler.record('objects')
+                with self._results_lock:
+                    self.objects = objects
+
+    def _encode(self):
+        for captured_at, frame in self._items(self.to_encode):
+            if self.encode:
+                start = time.perf_counter()
+                _, buffer = cv2.imencode('.jpg', frame)
+                frame = buffer.tobytes()
+                self.timings['encode'].add(time.perf_counter() - start)
+            self._put(self.encoded, (captured_at, frame))
+        self._put(self.encoded, _END)
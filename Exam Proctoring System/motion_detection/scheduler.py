@@ -0,0 +1,91 @@
+import threading
+import time
+
+
+class Rule:
+    """When a detector may run.
+
+    :param every_n: at least this many frames between runs.
+    :param on_motion: only run on frames where motion was detected (the
+        first run always happens, so there is a result to carry forward).
+    :param max_hz: at most this many runs per second, or None for no cap.
+    """
+
+    def __init__(self, every_n=1, on_motion=False, max_hz=None):
+        self.every_n = every_n
+        self.on_motion = on_motion
+        self.max_hz = max_hz
+
+    def __repr__(self):
+        return f"Rule(every_n={self.every_n}, on_motion={self.on_motion}, max_hz={self.max_hz})"
+
+
+# YOLO only looks again when something moves, DeepFace about once a second
+DEFAULT_SCHEDULE = {
+    'objects': Rule(every_n=5, on_motion=True, max_hz=2),
+    'emotion': Rule(every_n=15, max_hz=1),
+}
+
+
+class InferenceScheduler:
+    """Decides per frame which heavy detectors are due.
+
+    The frame loop calls `tick(motion)` once per frame and gets the names
+    of the detectors to run on it, and whoever runs one calls
+    `record(name)` so the stats show real runs. Frames where a detector is
+    not due reuse its last result.
+
+    :param rules: dict of detector name -> Rule.
+    """
+
+    def __init__(self, rules=None):
+        self.rules = dict(DEFAULT_SCHEDULE if rules is None else rules)
+        self.frames = 0
+        self._runs = {name: 0 for name in self.rules}
+        self._last = {}  # name -> (frame index, time) of the last run
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def tick(self, motion):
+        """Count a frame and return the detectors due on it."""
+        now = time.monotonic()
+        with self._lock:
+            self.frames += 1
+            due = [name for name, rule in self.rules.items() if self._due(name, rule, motion, now)]
+            for name in due:
+                self._last[name] = (self.frames, now)
+            return due
+
+    def record(self, name):
+        """Count a finished run of detector `name`."""
+        with self._lock:
+            self._runs[name] += 1
+
+    def stats(self):
+        """Runs, share of frames and effective rate (Hz) of each detector."""
+        with self._lock:
+            elapsed = max(time.monotonic() - self._started, 1e-9)
+            return {
+                'frames': self.frames,
+                'fps': self.frames / elapsed,
+                'detectors': {
+                    name: {
+                        'rule': repr(self.rules[name]),
+                        'runs': runs,
+                        'frame_share': runs / self.frames if self.frames else 0.0,
+                        'hz': runs / elapsed,
+                    }
+                    for name, runs in self._runs.items()
+                },
+            }
+
+    def _due(self, name, rule, motion, now):
+        last = self._last.get(name)
+        if last is None:
+            return True
+        last_frame, last_time = last
+        if rule.on_motion and not motion:
+            return False
+        if self.frames - last_frame < rule.every_n:
+            return False
+        return rule.max_hz is None or now - last_time >= 1.0 / rule.max_hz
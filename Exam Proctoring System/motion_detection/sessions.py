@@ -0,0 +1,299 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import cv2
+
+from .broadcast import FrameBroadcaster
+from .motion_detector import MotionDetector
+from .motion_engine import MotionEngine
+from .sources import open_source
+
+
+class BatchInference:
+    """Shared pool of YOLO / DeepFace workers for every proctoring session.
+
+    Sessions queue their latest frame together with the detectors due on
+    it; a newer frame from the same session replaces the queued one. Each
+    worker owns a detector (cv2.dnn networks are not thread-safe), takes
+    up to `max_batch` queued frames from different sessions and runs YOLO
+    on all of them in one batched forward pass.
+
+    cv2.dnn already spreads each forward pass over every core, so a
+    couple of workers (one decoding or running DeepFace while the other
+    is in a forward pass) keep the cores busy; every extra worker holds
+    another copy of the network.
+
+    :param detector_factory: callable returning a new detectors.ObjectDetector.
+    :param workers: worker threads.
+    :param max_batch: most frames stacked into one forward pass.
+    """
+
+    def __init__(self, detector_factory, workers=2, max_batch=8):
+        self.detector_factory = detector_factory
+        self.max_batch = max_batch
+        self.batches = 0
+        self.frames = 0
+        self.errors = 0
+        self._pending = OrderedDict()  # session id -> (session, frame, due detectors)
+        self._ready = threading.Condition()
+        self._stopped = False
+        self._threads = [threading.Thread(target=self._work, daemon=True)
+                         for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, session, frame, due):
+        with self._ready:
+            queued = self._pending.pop(session.id, None)
+            if queued is not None:
+                due = set(due) | queued[2]
+            self._pending[session.id] = (session, frame, set(due))
+            self._ready.notify()
+
+    def stats(self):
+        with self._ready:
+            return {
+                'workers': len(self._threads),
+                'batches': self.batches,
+                'frames': self.frames,
+                'mean_batch': self.frames / self.batches if self.batches else 0.0,
+                'queued': len(self._pending),
+                'errors': self.errors,
+            }
+
+    def stop(self):
+        with self._ready:
+            self._stopped = True
+            self._ready.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def _take(self):
+        with self._ready:
+            self._ready.wait_for(lambda: self._pending or self._stopped)
+            if self._stopped:
+                return None
+            batch = []
+            while self._pending and len(batch) < self.max_batch:
+                batch.append(self._pending.popitem(last=False)[1])
+            self.batches += 1
+            self.frames += len(batch)
+            return batch
+
+    def _work(self):
+        detector = None  # loaded on the first batch
+        while True:
+            batch = self._take()
+            if batch is None:
+                return
+            try:
+                detector = self._run(batch, detector)
+            except Exception as e:
+                # Keep the worker alive; the sessions get results again with their next frames
+                self.errors += 1
+                print(f"Error running inference on a batch of {len(batch)} frames: {e}")
+
+    def _run(self, batch, detector):
+        for session, frame, due in batch:
+            if 'emotion' in due:
+                session.set_results(emotion=session.detector.detect_emotion(frame))
+                session.detector.scheduler.record('emotion')
+
+        wanted = [(session, frame) for session, frame, due in batch if 'objects' in due]
+        if wanted:
+            detector = detector or self.detector_factory()
+            results = detector.detect_batch([frame for _, frame in wanted])
+            for (session, _), objects in zip(wanted, results):
+                session.set_results(objects=objects)
+                session.detector.scheduler.record('objects')
+        return detector
+
+
+class ProctorSession:
+    """One candidate's stream: its own motion state, alarms and latest results.
+
+    Frames arrive through `submit`, either from an upload or from a
+    capture thread reading a file / RTSP / frame directory `source`. Motion detection runs
+    on every frame in the submitting thread; YOLO and DeepFace run in the
+    shared BatchInference pool when the session's scheduler says so.
+
+    :param motion_args: MotionEngine arguments (scale, method, roi, ...).
+    """
+
+    def __init__(self, session_id, inference, source=None, realtime=True, motion_args=None, **detector_args):
+        self.id = session_id
+        self.inference = inference
+        self.source = source
+        self.detector = MotionDetector(source=None, name=session_id,
+                                       motion_engine=MotionEngine(**(motion_args or {})), **detector_args)
+        self.emotion = None
+        self.objects = []
+        self.frames = 0
+        self.latest = None  # last annotated frame
+        self.last_active = time.monotonic()  # when the last frame arrived
+        self._updated = threading.Condition()
+        self._detecting = threading.Lock()  # motion state of the stream
+        self._closed = threading.Event()
+        self._reader = None
+        self.broadcaster = FrameBroadcaster(self.annotated_frames)  # the session's video feed
+        if source is not None:
+            self._reader = threading.Thread(target=self._read, args=(source, realtime), daemon=True)
+            self._reader.start()
+
+    def submit(self, frame):
+        """Process one frame; returns whether motion was detected."""
+        original = frame.copy()
+        # Concurrent uploads would race on the previous frame and the counters
+        with self._detecting:
+            frame, motion_detected = self.detector.detect_motion(frame)
+            if motion_detected:
+                self.detector.save_snapshot(frame)
+            due = self.detector.scheduler.tick(motion_detected)
+        if due:
+            self.inference.submit(self, original, due)
+
+        with self._updated:
+            self.detector.draw_emotion(frame, self.emotion)
+            self.detector.draw_objects(frame, self.objects)
+            self.latest = frame
+            self.frames += 1
+            self.last_active = time.monotonic()
+            self._updated.notify_all()
+        return motion_detected
+
+    def set_results(self, emotion=None, objects=None):
+        with self._updated:
+            if emotion is not None:
+                self.emotion = emotion
+            if objects is not None:
+                self.objects = objects
+
+    def wait_frame(self, seen, timeout=1.0):
+        """(frame number, annotated frame) once a frame newer than `seen` exists."""
+        with self._updated:
+            self._updated.wait_for(lambda: self.frames > seen or self._closed.is_set(), timeout)
+            return self.frames, self.latest
+
+    def annotated_frames(self):
+        """Each new annotated frame until the session closes."""
+        seen = 0
+        while not self.closed:
+            frames, frame = self.wait_frame(seen)
+            if frames > seen and frame is not None:
+                seen = frames
+                yield frame
+
+    def status(self):
+        with self._updated:
+            return {
+                'session_id': self.id,
+                'source': self.source,
+                'frames': self.frames,
+                'motion_count': self.detector.motion_count,
+                'alarm_triggered': self.detector.alarm_triggered,
+                'emotion': self.emotion,
+                'objects': [{'label': label, 'confidence': confidence, 'box': list(box)}
+                            for label, confidence, box in self.objects],
+            }
+
+    @property
+    def closed(self):
+        return self._closed.is_set()
+
+    def close(self):
+        self._closed.set()
+        with self._updated:
+            self._updated.notify_all()
+        if self._reader is not None:
+            self._reader.join()
+
+    def _read(self, source, realtime):
+        cap = open_source(source)
+        # Files are read at their own frame rate, live streams as they arrive
+        interval = 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 30) if realtime else 0
+        next_frame = time.monotonic()
+        try:
+            while not self._closed.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                self.submit(frame)
+                next_frame += interval
+                time.sleep(max(0.0, next_frame - time.monotonic()))
+        finally:
+            cap.release()
+
+
+class SessionManager:
+    """Proctoring sessions of one server process, sharing one BatchInference pool.
+
+    :param detector_factory: callable returning a new detectors.ObjectDetector.
+    :param workers, max_batch: see BatchInference.
+    :param motion_args: default MotionEngine arguments of every session.
+    :param idle_timeout: seconds without a new frame after which a session
+        is closed and removed; None keeps sessions until they are closed.
+    :param session_args: passed to every session's MotionDetector
+        (motion_threshold, reset_interval, schedule, events, ...).
+    """
+
+    def __init__(self, detector_factory, workers=2, max_batch=8, motion_args=None, idle_timeout=600.0,
+                 **session_args):
+        self.inference = BatchInference(detector_factory, workers, max_batch)
+        self.motion_args = motion_args or {}
+        self.idle_timeout = idle_timeout
+        self.session_args = session_args
+        self.expired = 0
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._reaper = None
+        if idle_timeout is not None:
+            self._reaper = threading.Thread(target=self._expire, daemon=True)
+            self._reaper.start()
+
+    def create(self, source=None, realtime=True, roi=None):
+        """Start a session; `roi` (x, y, w, h) limits motion detection to the candidate's seat."""
+        motion_args = dict(self.motion_args, roi=tuple(roi) if roi else self.motion_args.get('roi'))
+        session = ProctorSession(uuid.uuid4().hex, self.inference, source, realtime, motion_args,
+                                 **self.session_args)
+        with self._lock:
+            self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id):
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def close(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.close()
+        return session is not None
+
+    def sessions(self):
+        with self._lock:
+            return list(self._sessions.values())
+
+    def stats(self):
+        return {'sessions': [session.status() for session in self.sessions()],
+                'expired': self.expired,
+                'inference': self.inference.stats()}
+
+    def stop(self):
+        """Close every session and stop the inference workers."""
+        self._stopped.set()
+        if self._reaper is not None:
+            self._reaper.join()
+        for session in self.sessions():
+            self.close(session.id)
+        self.inference.stop()
+
+    def _expire(self):
+        while not self._stopped.wait(min(self.idle_timeout / 4, 30.0)):
+            now = time.monotonic()
+            for session in self.sessions():
+                if now - session.last_active > self.idle_timeout and self.close(session.id):
+                    self.expired += 1
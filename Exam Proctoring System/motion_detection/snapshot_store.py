@@ -0,0 +1,157 @@
+import os
+import sqlite3
+import threading
+import time
+
+import cv2
+
+SCHEMA = '''CREATE TABLE IF NOT EXISTS snapshots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session TEXT,
+                timestamp REAL NOT NULL,
+                path TEXT NOT NULL,
+                thumbnail TEXT,
+                reason TEXT NOT NULL
+            )'''
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS snapshots_timestamp ON snapshots (timestamp)",
+    "CREATE INDEX IF NOT EXISTS snapshots_session ON snapshots (session, id)",
+)
+COLUMNS = ('id', 'session', 'timestamp', 'path', 'thumbnail', 'reason')
+
+
+class SnapshotStore:
+    """Snapshot images on disk plus a SQLite index of them.
+
+    Images go to one subdirectory per day (`directory/YYYYMMDD/`), and
+    every image has an index row (session, timestamp, path, thumbnail,
+    reason), so listing snapshots is an indexed query costing the page
+    size, however many files there are. Ids grow with insertion and serve
+    as the pagination cursor.
+
+    :param directory: root directory of the images.
+    :param index_path: SQLite file; defaults to `directory/index.db`.
+    :param max_age: seconds a snapshot is kept, or None.
+    :param max_count: most snapshots kept (oldest deleted first), or None.
+    :param thumbnail_width: also write a thumbnail this wide, or None.
+    :param retention_every: apply the retention limits every this many adds.
+    """
+
+    def __init__(self, directory='static/snapshots', index_path=None, max_age=None, max_count=None,
+                 thumbnail_width=None, retention_every=50):
+        self.directory = directory
+        self.index_path = index_path or os.path.join(directory, 'index.db')
+        self.max_age = max_age
+        self.max_count = max_count
+        self.thumbnail_width = thumbnail_width
+        self.retention_every = retention_every
+        self._adds = 0
+        self._local = threading.local()
+        os.makedirs(directory, exist_ok=True)
+        conn = self.connection()
+        conn.execute(SCHEMA)
+        for statement in INDEXES:
+            conn.execute(statement)
+        conn.commit()
+
+    def connection(self):
+        """This thread's connection, opened on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.index_path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")  # pages are read while the writer inserts
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, frame, session=None, reason='motion', timestamp=None):
+        """Write a snapshot image (and thumbnail) and index it; returns its record."""
+        timestamp = time.time() if timestamp is None else timestamp
+        local = time.localtime(timestamp)
+        day_dir = os.path.join(self.directory, time.strftime("%Y%m%d", local))
+        os.makedirs(day_dir, exist_ok=True)
+        name = f"snapshot_{session}_" if session else "snapshot_"
+        name += time.strftime("%Y%m%d-%H%M%S", local) + f"-{int(timestamp * 1000) % 1000:03d}"
+        path = os.path.join(day_dir, name + '.jpg')
+        cv2.imwrite(path, frame)
+
+        thumbnail = None
+        if self.thumbnail_width:
+            height, width = frame.shape[:2]
+            size = (self.thumbnail_width, max(1, height * self.thumbnail_width // width))
+            thumbnail = os.path.join(day_dir, name + '_thumb.jpg')
+            cv2.imwrite(thumbnail, cv2.resize(frame, size, interpolation=cv2.INTER_AREA))
+
+        conn = self.connection()
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO snapshots (session, timestamp, path, thumbnail, reason) VALUES (?, ?, ?, ?, ?)",
+                (session, timestamp, path, thumbnail, reason))
+        self._adds += 1
+        if self.retention_every and self._adds % self.retention_every == 0:
+            self.apply_retention()
+        return dict(zip(COLUMNS, (cursor.lastrowid, session, timestamp, path, thumbnail, reason)))
+
+    def page(self, limit=50, before=None, session=None):
+        """Newest snapshots first, `limit` at a time.
+
+        :param before: the `next` cursor of the previous page, or None for the newest.
+        :returns: (records, next cursor or None on the last page).
+        """
+        query = "SELECT id, session, timestamp, path, thumbnail, reason FROM snapshots"
+        conditions, params = [], []
+        if before is not None:
+            conditions.append("id < ?")
+            params.append(before)
+        if session is not None:
+            conditions.append("session = ?")
+            params.append(session)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        rows = self.connection().execute(query + " ORDER BY id DESC LIMIT ?", params + [limit + 1]).fetchall()
+        records = [dict(zip(COLUMNS, row)) for row in rows[:limit]]
+        return records, records[-1]['id'] if len(rows) > limit else None
+
+    def between(self, start, end, session=None, limit=500):
+        """Snapshots taken in [start, end) (Unix seconds), oldest first."""
+        query = ("SELECT id, session, timestamp, path, thumbnail, reason FROM snapshots "
+                 "WHERE timestamp >= ? AND timestamp < ?")
+        params = [start, end]
+        if session is not None:
+            query += " AND session = ?"
+            params.append(session)
+        rows = self.connection().execute(query + " ORDER BY timestamp LIMIT ?", params + [limit]).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def count(self):
+        return self.connection().execute("SELECT COUNT(*) FROM snapshots").fetchone()[0]
+
+    def apply_retention(self):
+        """Delete snapshots beyond max_age / max_count; returns how many went."""
+        conn = self.connection()
+        expired = []
+        if self.max_age is not None:
+            expired += conn.execute("SELECT id, path, thumbnail FROM snapshots WHERE timestamp < ?",
+                                    (time.time() - self.max_age,)).fetchall()
+        if self.max_count is not None:
+            expired += conn.execute("SELECT id, path, thumbnail FROM snapshots ORDER BY id DESC LIMIT -1 OFFSET ?",
+                                    (self.max_count,)).fetchall()
+        if not expired:
+            return 0
+
+        ids = sorted({row[0] for row in expired})
+        directories = set()
+        for _, path, thumbnail in expired:
+            for file in (path, thumbnail):
+                if file:
+                    directories.add(os.path.dirname(file))
+                    try:
+                        os.remove(file)
+                    except FileNotFoundError:
+                        pass
+        with conn:
+            conn.executemany("DELETE FROM snapshots WHERE id = ?", [(i,) for i in ids])
+        for directory in directories:
+            if not os.listdir(directory):
+                os.rmdir(directory)  # a day with nothing left
+        return len(ids)
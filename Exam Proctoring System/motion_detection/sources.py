@@ -0,0 +1,43 @@
+import os
+
+import cv2
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+class FrameDirectory:
+    """Reads the images of a directory in name order, like a cv2.VideoCapture."""
+
+    def __init__(self, path, fps=30.0):
+        self.paths = sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if name.lower().endswith(IMAGE_EXTENSIONS))
+        self.fps = fps
+        self.position = 0
+
+    def isOpened(self):
+        return bool(self.paths)
+
+    def read(self):
+        while self.position < len(self.paths):
+            frame = cv2.imread(self.paths[self.position])
+            self.position += 1
+            if frame is not None:
+                return True, frame
+        return False, None
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self.paths))
+        return 0.0
+
+    def release(self):
+        self.position = len(self.paths)
+
+
+def open_source(source):
+    """Capture for a camera index, video file, stream URL or directory of frames."""
+    if isinstance(source, str) and os.path.isdir(source):
+        return FrameDirectory(source)
+    return cv2.VideoCapture(source)
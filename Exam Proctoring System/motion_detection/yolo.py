@@ -0,0 +1,36 @@
+import cv2
+import numpy as np
+
+
+def decode_outputs(outputs, width, height, conf_threshold=0.5, nms_threshold=0.4, classes=None):
+    """Turn raw YOLO output layers into detections on a `width` x `height` frame.
+
+    Each output row is (cx, cy, w, h, objectness, class scores...) in
+    relative coordinates. All rows are decoded at once with array
+    operations, then overlapping boxes are removed with NMS. If `classes`
+    (an array of class ids) is given, other detections are dropped first.
+
+    :returns: list of (class id, confidence, (x, y, w, h)), empty if nothing
+        passes the threshold.
+    """
+    rows = np.concatenate([output.reshape(-1, output.shape[-1]) for output in outputs])
+    scores = rows[:, 5:]
+    class_ids = scores.argmax(axis=1)
+    confidences = scores[np.arange(len(rows)), class_ids]
+    keep = confidences > conf_threshold
+    if classes is not None:
+        keep &= np.isin(class_ids, classes)
+    if not keep.any():
+        return []
+
+    rows, class_ids, confidences = rows[keep], class_ids[keep], confidences[keep]
+    centers_x = np.trunc(rows[:, 0] * width)
+    centers_y = np.trunc(rows[:, 1] * height)
+    widths = np.trunc(rows[:, 2] * width)
+    heights = np.trunc(rows[:, 3] * height)
+    boxes = np.stack([np.trunc(centers_x - widths / 2), np.trunc(centers_y - heights / 2),
+                      widths, heights], axis=1).astype(int)
+
+    indexes = cv2.dnn.NMSBoxes(boxes.tolist(), confidences.tolist(), conf_threshold, nms_threshold)
+    indexes = np.asarray(indexes, dtype=int).reshape(-1)  # () or an N x 1 array, by OpenCV version
+    return [(int(class_ids[i]), float(confidences[i]), tuple(int(v) for v in boxes[i])) for i in indexes]
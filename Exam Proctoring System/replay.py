@@ -0,0 +1,140 @@
+"""Offline replay and benchmark of the proctoring pipeline.
+
+    python replay.py exam_clip.mp4 --detector yolov4-tiny --size 320 --no-encode --output report.json
+    python replay.py frames_dir/ --detector none --no-emotion
+
+Feeds a video file or a directory of frames through the same
+FramePipeline as /video_feed, with no camera and no browser, and writes
+a JSON report: end-to-end FPS, per-stage latency histograms (capture,
+motion, emotion, objects, encode, end to end), dropped frames, how often
+each detector ran, and peak memory. By default every frame is processed
+as fast as possible; --realtime paces the source at its own frame rate
+and lets the pipeline drop frames like a live camera would.
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+
+import cv2
+
+from motion_detection.detectors import create_detector
+from motion_detection.events import create_event_bus
+from motion_detection.motion_detector import DeepFace, MotionDetector
+from motion_detection.pipeline import FramePipeline
+from motion_detection.scheduler import DEFAULT_SCHEDULE
+from motion_detection.snapshot_store import SnapshotStore
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class ReplaySource:
+    """Wraps a capture to stop after `limit` frames and optionally pace it in real time."""
+
+    def __init__(self, cap, limit=None, realtime=False):
+        self.cap = cap
+        self.limit = limit
+        self.frames = 0
+        self.interval = 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 30) if realtime else 0.0
+        self.next_frame = None
+
+    def read(self):
+        if self.limit is not None and self.frames >= self.limit:
+            return False, None
+        if self.interval:
+            now = time.monotonic()
+            self.next_frame = now if self.next_frame is None else self.next_frame + self.interval
+            time.sleep(max(0.0, self.next_frame - now))
+        ret, frame = self.cap.read()
+        if ret:
+            self.frames += 1
+        return ret, frame
+
+    def release(self):
+        self.cap.release()
+
+
+def peak_memory_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10  # bytes on macOS, KiB on Linux
+
+
+def replay(source, detector='yolov4', size=416, emotion=True, encode=True, realtime=False, limit=None):
+    """Run the pipeline over `source` and return the report dict."""
+    schedule = {name: rule for name, rule in DEFAULT_SCHEDULE.items()
+                if (name != 'objects' or detector != 'none') and (name != 'emotion' or emotion)}
+    object_detector = None if detector == 'none' else create_detector(detector, input_size=size)
+
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        events = create_event_bus(SnapshotStore(snapshot_dir))
+        motion_detector = MotionDetector(source=source, schedule=schedule, object_detector=object_detector,
+                                         events=events, name='replay')
+        if motion_detector.cap is None or not motion_detector.cap.isOpened():
+            raise SystemExit(f"Cannot open {source}")
+        motion_detector.cap = ReplaySource(motion_detector.cap, limit, realtime)
+        pipeline = FramePipeline(motion_detector, drop=realtime, encode=encode)
+
+        start = time.perf_counter()
+        pipeline.start()
+        output_bytes = 0
+        try:
+            for frame in pipeline.frames():
+                output_bytes += len(frame) if encode else 0
+        finally:
+            pipeline.stop()
+            motion_detector.release()
+            events.close()
+        seconds = time.perf_counter() - start
+
+    frames_in = motion_detector.cap.frames
+    return {
+        'source': str(source),
+        'config': {'detector': detector, 'input_size': size, 'emotion': emotion, 'encode': encode,
+                   'realtime': realtime},
+        'frames_in': frames_in,
+        'frames_out': pipeline.frames_out,
+        'seconds': seconds,
+        'fps': pipeline.frames_out / seconds if seconds else 0.0,
+        'mean_jpeg_kb': output_bytes / pipeline.frames_out / 1024 if encode and pipeline.frames_out else None,
+        **pipeline.stats(),
+        'scheduler': motion_detector.scheduler.stats()['detectors'],
+        'peak_memory_mb': peak_memory_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recording through the proctoring pipeline.")
+    parser.add_argument('source', help="Video file or directory of frames")
+    parser.add_argument('--detector', default='yolov4', help="Object detector name, or 'none' to skip YOLO")
+    parser.add_argument('--size', type=int, default=416, help="Detector input size")
+    parser.add_argument('--no-emotion', action='store_true', help="Skip DeepFace")
+    parser.add_argument('--no-encode', action='store_true', help="Skip the JPEG multipart output")
+    parser.add_argument('--realtime', action='store_true', help="Pace the source at its frame rate")
+    parser.add_argument('--frames', type=int, help="Stop after this many frames")
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    emotion = not args.no_emotion
+    if emotion and DeepFace is None:
+        print("deepface is not installed, running without emotion detection", file=sys.stderr)
+        emotion = False
+    report = replay(args.source, args.detector, args.size, emotion, not args.no_encode, args.realtime,
+                    args.frames)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+        print(f"{report['frames_out']} frames in {report['seconds']:.2f}s ({report['fps']:.1f} fps), "
+              f"report in {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
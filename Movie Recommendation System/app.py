@@ -1,24 +1,23 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
 
 from werkzeug.security import generate_password_hash, check_password_hash
-import pandas as pd
+import os
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-import sqlite3
+
+from recommender import NeighbourIndex, top_n
+from model_store import build_model, current_version, load_model
+from incremental import LiveModel
+from cache import RecommendationCache
+from user_store import UserStore
 
 app = Flask(__name__)
 app.secret_key = "your_secret_key"
+# Users live in SQLite behind a shared connection pool (see user_store.py)
+DATABASE = 'users.db'
+user_store = UserStore(DATABASE)
+
 def init_db():
-    conn = sqlite3.connect('users.db')
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT NOT NULL,
-                    email TEXT UNIQUE NOT NULL,
-                    password TEXT NOT NULL
-                )''')
-    conn.commit()
-    conn.close()
+    user_store.init_schema()
 
 # Register route
 @app.route('/register', methods=['GET', 'POST'])
@@ -34,19 +33,11 @@ def register():
             return redirect(url_for('register'))
 
         hashed_password = generate_password_hash(password)
-        conn = sqlite3.connect('users.db')
-        c = conn.cursor()
-        try:
-            c.execute("INSERT INTO users (username, email, password) VALUES (?, ?, ?)",
-                      (username, email, hashed_password))
-            conn.commit()
+        if user_store.add_user(username, email, hashed_password):
             flash("Registration successful! Please log in.", "success")
             return redirect(url_for('login'))
-        except sqlite3.IntegrityError:
-            flash("Email already exists!", "danger")
-            return redirect(url_for('register'))
-        finally:
-            conn.close()
+        flash("Email already exists!", "danger")
+        return redirect(url_for('register'))
     return render_template('register.html')
 
 # Login route
@@ -56,13 +47,9 @@ def login():
         email = request.form['email']
         password = request.form['password']
 
-        conn = sqlite3.connect('users.db')
-        c = conn.cursor()
-        c.execute("SELECT * FROM users WHERE email = ?", (email,))
-        user = c.fetchone()
-        conn.close()
+        user = user_store.find_by_email(email)
 
-        if user and check_password_hash(user[3], password):  # user[3] is the hashed password
+        if user and check_password_hash(user[2], password):  # user[2] is the hashed password
             session['user_id'] = user[0]  # user[0] is the user ID
             session['username'] = user[1]  # user[1] is the username
             flash(f"Welcome back, {user[1]}!", "success")
@@ -80,48 +67,87 @@ def logout():
     return redirect(url_for('login'))
 
 
-# Load data
-movies = pd.read_csv("movies.csv")
-ratings = pd.read_csv("ratings.csv")
-
-# Preprocess data
-user_movie_matrix = ratings.pivot(index='userId', columns='movieId', values='rating')
-user_movie_matrix.fillna(0, inplace=True)
-user_similarity = cosine_similarity(user_movie_matrix)
-user_similarity_df = pd.DataFrame(user_similarity, index=user_movie_matrix.index, columns=user_movie_matrix.index)
+# Load the prebuilt model artifact (see build_model.py). Its arrays are
+# memory-mapped read-only, so workers start in milliseconds and share the
+# pages through the OS page cache.
+MODEL_DIR = 'model'
+NEIGHBOURS_K = 50
+MIN_SIMILARITY = 0.0
+NUM_FACTORS = 32
+
+# 'cf' scores with user-based collaborative filtering over the neighbour
+# index, 'mf' with the matrix-factorisation (ALS) factors
+RECOMMENDER_MODE = os.environ.get('RECOMMENDER_MODE', 'cf')
+
+if current_version(MODEL_DIR):
+    model = load_model(MODEL_DIR)
+else:
+    # No artifact yet: build the model in memory from the CSV files
+    import pandas as pd
+    print(f"No model in {MODEL_DIR!r}, building from CSV (run build_model.py to speed up startup)")
+    model = build_model(pd.read_csv("ratings.csv"), pd.read_csv("movies.csv"),
+                        k=NEIGHBOURS_K, min_similarity=MIN_SIMILARITY,
+                        factors=NUM_FACTORS if RECOMMENDER_MODE == 'mf' else 0)
+if RECOMMENDER_MODE == 'mf' and model.factor_model is None:
+    raise RuntimeError(f"Model {model.version} has no factors; rebuild it with build_model.py --factors")
+
+# Rating deltas are appended to a shared log (POST /ratings or
+# ingest_ratings.py) and applied on top of the artifact within seconds;
+# `ingest_ratings.py compact` folds them into a fresh artifact.
+RATING_LOG = os.path.join(MODEL_DIR, 'ratings_log.csv')
+live_model = LiveModel(model, MODEL_DIR, RATING_LOG)
+
+# Recent recommendation lists, keyed by user, count, model version and mode;
+# dropped when a user's ratings (or their neighbours') or the artifact change
+recommendation_cache = RecommendationCache(maxsize=10000, ttl=300)
+live_model.on_change(recommendation_cache.invalidate)
+
+# Pick the best unrated movies, in rank order, with their titles
+def top_recommendations(state, scores, rated_columns, num_recommendations):
+    scores[rated_columns] = -np.inf
+    columns, _ = top_n(scores[np.newaxis], num_recommendations)
+    columns = columns[0]
+    return state.catalogue.records(columns[columns >= 0])
 
 # Recommend movies for existing users
-def recommend_movies(user_id, num_recommendations=5):
-    if user_id not in user_movie_matrix.index:
+def recommend_movies(user_id, num_recommendations=5, mode=None):
+    mode = mode or RECOMMENDER_MODE
+    state = live_model.current()
+    key = (user_id, num_recommendations, state.version, mode)
+    return recommendation_cache.get_or_compute(
+        user_id, key, lambda: compute_recommendations(state, user_id, num_recommendations, mode))
+
+def compute_recommendations(state, user_id, num_recommendations, mode):
+    row = state.user_row(user_id)
+    if row is None:
         return []
 
-    similar_users = user_similarity_df[user_id].sort_values(ascending=False)
-    user_ratings = user_movie_matrix.mul(similar_users, axis=0).sum(axis=0)
-    user_ratings /= similar_users.sum()
-    recommendations = user_ratings[user_movie_matrix.loc[user_id] == 0]
-    recommendations = recommendations.sort_values(ascending=False).head(num_recommendations)
-
-    recommended_movies = movies[movies['movieId'].isin(recommendations.index)][['movieId', 'title']]
-    return recommended_movies.to_dict(orient='records')
-
-# Recommend movies for new users
-def recommend_for_new_user(preferences, num_recommendations=5):
-    new_user_ratings = pd.Series(0.0, index=user_movie_matrix.columns)
-    for movie_id, rating in preferences.items():
-        new_user_ratings[movie_id] = float(rating)
-    user_movie_matrix.loc['new_user'] = new_user_ratings
-
-    updated_similarity = cosine_similarity(user_movie_matrix)
-    similarity_df = pd.DataFrame(updated_similarity, index=user_movie_matrix.index, columns=user_movie_matrix.index)
-
-    similar_users = similarity_df.loc['new_user'].sort_values(ascending=False).iloc[1:]
-    user_ratings = user_movie_matrix.mul(similar_users, axis=0).sum(axis=0)
-    user_ratings /= similar_users.sum()
-    recommendations = user_ratings[user_movie_matrix.loc['new_user'] == 0]
-    recommendations = recommendations.sort_values(ascending=False).head(num_recommendations)
+    if mode == 'mf':
+        user_ratings = state.factor_scores(row=row)
+    else:
+        similar_rows, similar_users = state.neighbours_of(row)
+        if len(similar_rows) == 0:
+            return []
+        user_ratings = state.weighted_scores(similar_users, similar_rows)
+    return top_recommendations(state, user_ratings, state.rated_columns(row), num_recommendations)
+
+# Recommend movies for new users by folding their preferences into the
+# precomputed user vectors (or item factors); nothing shared is modified.
+def recommend_for_new_user(preferences, num_recommendations=5, mode=None):
+    state = live_model.current()
+    new_user_ratings = state.preference_vector(preferences)
+    if new_user_ratings.nnz == 0:
+        return []
 
-    recommended_movies = movies[movies['movieId'].isin(recommendations.index)][['movieId', 'title']]
-    return recommended_movies.to_dict(orient='records')
+    if (mode or RECOMMENDER_MODE) == 'mf':
+        user_ratings = state.factor_scores(vector=new_user_ratings)
+    else:
+        similarities = state.fold_in_similarity(new_user_ratings)
+        similar_rows, similar_users = NeighbourIndex.top_k(similarities, state.k, state.min_similarity)
+        if len(similar_rows) == 0:
+            return []
+        user_ratings = state.weighted_scores(similar_users, similar_rows)
+    return top_recommendations(state, user_ratings, new_user_ratings.indices, num_recommendations)
 
 @app.route('/')
 def home():
@@ -153,8 +179,34 @@ def new_user():
         recommended_movies = recommend_for_new_user(preferences)
         return render_template("new_user_recommendations.html", movies=recommended_movies)
 
-    initial_movies = movies.sample(10).to_dict(orient='records')
+    initial_movies = live_model.current().catalogue.sample(10)
     return render_template("new_user.html", movies=initial_movies)
+# Range of the MovieLens star ratings
+MIN_RATING, MAX_RATING = 0.5, 5.0
+
+# Ingest new ratings: a JSON list of {"userId", "movieId", "rating"} objects
+# or a single rating as form fields
+@app.route('/ratings', methods=['POST'])
+def add_ratings():
+    if 'user_id' not in session:
+        return jsonify({'error': 'login required'}), 401
+    payload = request.get_json(silent=True)
+    if payload is None:
+        payload = [request.form]
+    try:
+        records = [(int(r['userId']), int(r['movieId']), float(r['rating'])) for r in payload]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'expected userId, movieId and rating'}), 400
+    # Out-of-range ratings would be logged for good and replayed by every compaction
+    if not all(MIN_RATING <= rating <= MAX_RATING for _, _, rating in records):
+        return jsonify({'error': f'rating must be between {MIN_RATING} and {MAX_RATING}'}), 400
+    live_model.ingest(records)
+    return jsonify({'ingested': len(records), 'model_version': live_model.current().version})
+
+@app.route('/cache_stats')
+def cache_stats():
+    return jsonify(recommendation_cache.stats())
+
 @app.route('/recommendation')
 def recommendation():
     return render_template("recommendation.html")
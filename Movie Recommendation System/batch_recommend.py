@@ -0,0 +1,172 @@
+"""Recommendations for many users at once, e.g. for nightly email campaigns.
+
+    python batch_recommend.py --output recommendations.csv
+    python batch_recommend.py --users 1 2 3 --num 10 --output picks.parquet
+    python batch_recommend.py --benchmark 200
+
+Users are scored a chunk at a time: the neighbours' sparse ratings are
+multiplied with one neighbours x chunk weight matrix, already-rated movies
+are masked and the top N per user is picked by partial selection
+(np.partition) rather than a full sort. Results are streamed to CSV or
+Parquet chunk by chunk.
+"""
+import argparse
+import csv
+import os
+import time
+
+import numpy as np
+
+from incremental import LiveModel
+from model_store import load_model
+from recommender import top_n
+
+
+def recommend_batch(state, user_ids, num_recommendations=5, chunk_size=1024):
+    """Yield (user_ids, movie_ids, scores) for each chunk of `user_ids`.
+
+    `movie_ids` and `scores` are chunk x num_recommendations arrays ranked
+    best first. Unknown users and users without neighbours get no
+    recommendations (movie id -1, score NaN).
+    """
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = list(user_ids[start:start + chunk_size])
+        movie_ids, scores = _score_chunk(state, chunk, num_recommendations)
+        yield chunk, movie_ids, scores
+
+
+def _score_chunk(state, user_ids, num_recommendations):
+    n_movies = len(state.movie_ids)
+    n = min(num_recommendations, n_movies)
+    movie_ids = np.full((len(user_ids), n), -1, dtype=np.int64)
+    scores = np.full((len(user_ids), n), np.nan)
+
+    rows = [state.user_row(user_id) for user_id in user_ids]
+    known = np.array([row is not None for row in rows], dtype=bool)
+    rows = np.array([row for row in rows if row is not None], dtype=np.int64)
+    if len(rows) == 0:
+        return movie_ids, scores
+    neighbours, sims = state.neighbour_arrays(rows)
+
+    # Dense (neighbours x chunk) weights, columns normalised to sum to 1, so
+    # the chunk is scored with one sparse x dense product.
+    valid = neighbours >= 0
+    totals = sims.sum(axis=1)
+    neighbour_rows, neighbour_cols = np.unique(neighbours[valid], return_inverse=True)
+    weights = np.zeros((len(neighbour_rows), len(rows)), dtype=np.float32)
+    weights[neighbour_cols, np.nonzero(valid)[0]] = (sims / np.where(totals > 0, totals, 1)[:, None])[valid]
+    ratings_t = state.user_vectors(neighbour_rows).T.tocsr().astype(np.float32)
+    chunk_scores = ratings_t.dot(weights).T
+
+    # Mask everything the users already rated
+    rated = state.user_vectors(rows).tocoo()
+    chunk_scores[rated.row, rated.col] = -np.inf
+    chunk_scores[totals == 0] = -np.inf
+
+    top, top_scores = top_n(chunk_scores, n)
+    found = top >= 0
+    chunk_movies = np.full(top.shape, -1, dtype=np.int64)
+    chunk_movies[found] = state.movie_ids[top[found]]
+    movie_ids[known] = chunk_movies
+    scores[known] = np.where(found, top_scores, np.nan)
+    return movie_ids, scores
+
+
+def write_csv(path, batches, titles):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['userId', 'rank', 'movieId', 'title', 'score'])
+        for user_ids, movie_ids, scores in batches:
+            for user_id, user_movies, user_scores in zip(user_ids, movie_ids, scores):
+                for rank, (movie_id, score) in enumerate(zip(user_movies, user_scores), start=1):
+                    if movie_id >= 0:
+                        writer.writerow([user_id, rank, movie_id, titles[movie_id], f"{score:.6f}"])
+
+
+def write_parquet(path, batches, titles):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Writing Parquet requires pyarrow (pip install pyarrow)")
+
+    writer = None
+    try:
+        for user_ids, movie_ids, scores in batches:
+            valid = movie_ids >= 0
+            n = movie_ids.shape[1]
+            table = pa.table({
+                'userId': np.repeat(np.asarray(user_ids, dtype=np.int64), n)[valid.ravel()],
+                'rank': np.tile(np.arange(1, n + 1), len(user_ids))[valid.ravel()],
+                'movieId': movie_ids[valid],
+                'title': [titles[movie_id] for movie_id in movie_ids[valid].tolist()],
+                'score': scores[valid],
+            })
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def benchmark(state, user_ids, num_recommendations, chunk_size):
+    """Time the batch path against looping the single-user scoring.
+
+    Unknown users are skipped by both, as recommend_batch gives them no rows.
+    """
+    start = time.perf_counter()
+    for user_id in user_ids:
+        row = state.user_row(user_id)
+        if row is None:
+            continue
+        neighbours, sims = state.neighbours_of(row)
+        if len(neighbours) == 0:
+            continue
+        user_scores = state.weighted_scores(sims, neighbours)
+        user_scores[state.rated_columns(row)] = -np.inf
+        np.argsort(-user_scores, kind='stable')[:num_recommendations]
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in recommend_batch(state, user_ids, num_recommendations, chunk_size):
+        pass
+    batch_time = time.perf_counter() - start
+
+    print(f"{len(user_ids)} users: loop {loop_time * 1e3:.1f} ms, batch {batch_time * 1e3:.1f} ms "
+          f"({loop_time / batch_time:.1f}x faster)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch movie recommendations.")
+    parser.add_argument('--model', default='model', help="Artifact directory")
+    parser.add_argument('--users', type=int, nargs='*', help="User ids (default: every user)")
+    parser.add_argument('--num', type=int, default=5, help="Recommendations per user")
+    parser.add_argument('--chunk-size', type=int, default=1024, help="Users scored per matrix product")
+    parser.add_argument('--output', default='recommendations.csv', help=".csv or .parquet output file")
+    parser.add_argument('--benchmark', type=int, metavar='N',
+                        help="Only compare batch vs per-user scoring on N users")
+    args = parser.parse_args()
+
+    live_model = LiveModel(load_model(args.model), args.model, os.path.join(args.model, 'ratings_log.csv'))
+    state = live_model.current()
+    user_ids = args.users or state.user_ids()
+
+    if args.benchmark:
+        benchmark(state, user_ids[:args.benchmark], args.num, args.chunk_size)
+        return
+
+    start = time.perf_counter()
+    batches = recommend_batch(state, user_ids, args.num, args.chunk_size)
+    movies = state.catalogue
+    titles = dict(zip(movies.movie_ids.tolist(), movies.titles.tolist()))
+    if args.output.endswith('.parquet'):
+        write_parquet(args.output, batches, titles)
+    else:
+        write_csv(args.output, batches, titles)
+    print(f"Wrote recommendations for {len(user_ids)} users to {args.output} "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Concurrent load test of the user store and the /login route.
+
+    python bench_login.py --users 2000 --requests 4000 --threads 1 8 32
+
+Fills a temporary users.db, then for each thread count reports lookups
+per second for the old connect-per-request query and for UserStore, and
+requests per second for POST /login through the Flask test client. Test
+users get a cheap password hash so the numbers measure the database and
+request handling rather than PBKDF2.
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from werkzeug.security import generate_password_hash
+
+from user_store import UserStore
+
+PASSWORD = 'secret'
+
+
+def legacy_lookup(path):
+    """The original login query: a fresh connection per request."""
+    def lookup(email):
+        conn = sqlite3.connect(path)
+        c = conn.cursor()
+        c.execute("SELECT * FROM users WHERE email = ?", (email,))
+        user = c.fetchone()
+        conn.close()
+        return user
+    return lookup
+
+
+def run_threads(threads, total, work):
+    """Run `work(i)` for i in range(total) over `threads` threads; returns ops/s."""
+    per_thread = total // threads
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(offset):
+        barrier.wait()
+        for i in range(offset, offset + per_thread):
+            work(i)
+
+    pool = [threading.Thread(target=worker, args=(t * per_thread,)) for t in range(threads)]
+    for thread in pool:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in pool:
+        thread.join()
+    return per_thread * threads / (time.perf_counter() - start)
+
+
+def login_client(app):
+    """A cookie-less test client per thread, so every POST is a fresh login."""
+    local = threading.local()
+
+    def post(i, email):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client(use_cookies=False)
+        response = client.post('/login', data={'email': email, 'password': PASSWORD})
+        assert response.status_code == 302
+    return post
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test user lookups and POST /login.")
+    parser.add_argument('--users', type=int, default=2000, help="Users in the test database")
+    parser.add_argument('--requests', type=int, default=4000, help="Requests per run")
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8, 32])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, 'users.db')
+    store = UserStore(path)
+    store.init_schema()
+    password_hash = generate_password_hash(PASSWORD, method='pbkdf2:sha256:1000')
+    emails = [f'user{i}@example.com' for i in range(args.users)]
+    for i, email in enumerate(emails):
+        store.add_user(f'user{i}', email, password_hash)
+
+    import app as webapp
+    webapp.user_store = UserStore(path)
+    post_login = login_client(webapp.app)
+
+    legacy = legacy_lookup(path)
+    pooled = UserStore(path)
+    print(f"{args.users} users, {args.requests} requests per run")
+    print(f"{'threads':>7s} {'legacy/s':>10s} {'pooled/s':>10s} {'/login/s':>10s}")
+    for threads in args.threads:
+        legacy_rate = run_threads(threads, args.requests, lambda i: legacy(emails[i % len(emails)]))
+        pooled_rate = run_threads(threads, args.requests, lambda i: pooled.find_by_email(emails[i % len(emails)]))
+        login_rate = run_threads(threads, args.requests, lambda i: post_login(i, emails[i % len(emails)]))
+        print(f"{threads:7d} {legacy_rate:10.0f} {pooled_rate:10.0f} {login_rate:10.0f}")
+
+
+if __name__ == '__main__':
+    main()
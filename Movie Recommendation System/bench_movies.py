@@ -0,0 +1,59 @@
+"""Latency microbenchmark for the work behind POST /movies and POST /new_user.
+
+    python bench_movies.py --repeat 3
+
+Calls recommend_movies for every user (and recommend_for_new_user for
+random preference sets) against the loaded model and prints p50 / p99
+latency in milliseconds. The recommendation cache is cleared before each
+pass over the users, so '/movies cold' measures computing the lists and
+'/movies warm' a second request for each user, served from the cache.
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+import app
+
+
+def percentiles(timings):
+    timings = np.array(timings) * 1e3
+    return np.percentile(timings, 50), np.percentile(timings, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark recommendation latency.")
+    parser.add_argument('--repeat', type=int, default=3, help="Passes over all users")
+    parser.add_argument('--num', type=int, default=5, help="Recommendations per request")
+    args = parser.parse_args()
+
+    state = app.live_model.current()
+    user_ids = state.user_ids()
+    movie_ids = state.movie_ids.tolist()
+    rng = random.Random(0)
+    preferences = [
+        {movie_id: float(rng.randint(1, 5)) for movie_id in rng.sample(movie_ids, 10)}
+        for _ in range(len(user_ids))
+    ]
+
+    for names, func, inputs in [
+        (('/movies cold', '/movies warm'), app.recommend_movies, user_ids),
+        (('/new_user',), app.recommend_for_new_user, preferences),
+    ]:
+        func(inputs[0], args.num)  # warm up
+        timings = {name: [] for name in names}
+        for _ in range(args.repeat):
+            app.recommendation_cache.invalidate()
+            for name in names:
+                for value in inputs:
+                    start = time.perf_counter()
+                    func(value, args.num)
+                    timings[name].append(time.perf_counter() - start)
+        for name in names:
+            p50, p99 = percentiles(timings[name])
+            print(f"{name:14s} n={len(timings[name]):5d}  p50 {p50:.3f} ms  p99 {p99:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""Offline build of the movie recommendation model.
+
+Parses movies.csv / ratings.csv, computes the sparse ratings, normalised
+user vectors and neighbour lists, and writes them as a versioned artifact
+that app.py maps at startup:
+
+    python build_model.py --output model --neighbours 50 --factors 32
+
+With --factors > 0 the artifact also holds ALS user / item factors for
+the matrix-factorisation mode (RECOMMENDER_MODE=mf).
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from model_store import build_model, save_model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the movie recommendation model artifact.")
+    parser.add_argument('--movies', default='movies.csv', help="Path to movies.csv")
+    parser.add_argument('--ratings', default='ratings.csv', help="Path to ratings.csv")
+    parser.add_argument('--output', default='model', help="Artifact directory")
+    parser.add_argument('--neighbours', type=int, default=50, help="Neighbours kept per user (K)")
+    parser.add_argument('--min-similarity', type=float, default=0.0, help="Similarity floor for neighbours")
+    parser.add_argument('--factors', type=int, default=32,
+                        help="Latent factors for the matrix-factorisation mode (0 to skip)")
+    parser.add_argument('--regularization', type=float, default=20.0, help="ALS L2 regularisation")
+    parser.add_argument('--iterations', type=int, default=10, help="ALS iterations")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    movies = pd.read_csv(args.movies)
+    ratings = pd.read_csv(args.ratings)
+    model = build_model(ratings, movies, k=args.neighbours, min_similarity=args.min_similarity,
+                        factors=args.factors, regularization=args.regularization,
+                        iterations=args.iterations)
+    version = save_model(args.output, model)
+
+    n_users, n_movies = model.rating_matrix.shape
+    print(f"Built model {version}: {n_users} users, {n_movies} movies, "
+          f"{model.rating_matrix.matrix.nnz} ratings in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class RecommendationCache:
+    """Bounded LRU cache of recommendation lists with a TTL.
+
+    Entries are grouped by user so that `invalidate([...])` drops every
+    cached list of those users; `invalidate(None)` drops everything. A
+    value computed while its user was being invalidated is not stored, so
+    a slow request can never put a stale list back.
+
+    :param maxsize: most entries kept; the least recently used go first.
+    :param ttl: seconds an entry stays valid, as a safety net on top of
+        explicit invalidation.
+    """
+
+    def __init__(self, maxsize=10000, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires at, user id, value)
+        self._keys_by_user = {}
+        self._generations = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, user_id, key, compute):
+        """Return the cached value for `key`, computing and storing it on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            generation = (self._epoch, self._generations.get(user_id, 0))
+
+        value = compute()
+
+        with self._lock:
+            if generation == (self._epoch, self._generations.get(user_id, 0)):
+                self._store(user_id, key, value, now + self.ttl)
+        return value
+
+    def invalidate(self, user_ids=None):
+        """Drop the entries of `user_ids`, or of every user if None."""
+        with self._lock:
+            if user_ids is None:
+                self._entries.clear()
+                self._keys_by_user.clear()
+                self._generations.clear()
+                self._epoch += 1
+                return
+            for user_id in user_ids:
+                self._generations[user_id] = self._generations.get(user_id, 0) + 1
+                for key in self._keys_by_user.pop(user_id, ()):
+                    self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+            }
+
+    def _store(self, user_id, key, value, expires):
+        self._entries[key] = (expires, user_id, value)
+        self._entries.move_to_end(key)
+        self._keys_by_user.setdefault(user_id, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            old_key, (_, old_user, _) = self._entries.popitem(last=False)
+            keys = self._keys_by_user.get(old_user)
+            if keys is not None:
+                keys.discard(old_key)
+                if not keys:
+                    del self._keys_by_user[old_user]
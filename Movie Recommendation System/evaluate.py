@@ -0,0 +1,124 @@
+"""Offline comparison of the user-based CF and matrix-factorisation modes.
+
+    python evaluate.py --k 10 --factors 32 --test-fraction 0.2
+
+Holds out a random fraction of ratings.csv, trains both models on the rest
+and reports, per mode, training time, RMSE on the held-out ratings,
+precision@k (held-out ratings >= --relevant count as hits) and the mean
+time to score one user.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from matrix_factorization import FactorModel
+from recommender import NeighbourIndex, RatingMatrix, top_n
+
+
+def split_ratings(ratings, test_fraction, seed):
+    rng = np.random.default_rng(seed)
+    test = rng.random(len(ratings)) < test_fraction
+    return ratings[~test], ratings[test]
+
+
+def cf_scores(rating_matrix, neighbour_index, row):
+    rows, sims = neighbour_index.neighbours_of(row)
+    if len(rows) == 0:
+        return np.zeros(rating_matrix.shape[1])
+    return rating_matrix.weighted_scores(sims, rows)
+
+
+def cf_predict(rating_matrix, neighbour_index, row, columns):
+    """Similarity-weighted mean of the neighbours who rated each movie."""
+    user_ratings = rating_matrix.matrix[row]
+    fallback = user_ratings.data.mean() if user_ratings.nnz else rating_matrix.matrix.data.mean()
+    rows, sims = neighbour_index.neighbours_of(row)
+    if len(rows) == 0:
+        return np.full(len(columns), fallback)
+    neighbour_ratings = rating_matrix.matrix[rows][:, columns].toarray()
+    weights = (neighbour_ratings > 0) * sims[:, None]
+    totals = weights.sum(axis=0)
+    weighted = (neighbour_ratings * sims[:, None]).sum(axis=0)
+    return np.where(totals > 0, weighted / np.where(totals > 0, totals, 1), fallback)
+
+
+def evaluate(name, score_user, predict_user, rating_matrix, test, k, relevant):
+    """RMSE, precision@k and per-user scoring time of one mode."""
+    errors, precisions, timings = [], [], []
+    for user_id, user_test in test.groupby('userId'):
+        row = rating_matrix.user_row(user_id)
+        if row is None:
+            continue
+        columns = np.array([rating_matrix.movie_column(m) for m in user_test['movieId']], dtype=object)
+        known = np.array([c is not None for c in columns], dtype=bool)
+        if not known.any():
+            continue
+        columns = columns[known].astype(np.int64)
+        actual = user_test['rating'].to_numpy()[known]
+        errors.append(predict_user(row, columns) - actual)
+
+        start = time.perf_counter()
+        scores = score_user(row)
+        scores[rating_matrix.rated_columns(row)] = -np.inf
+        top, _ = top_n(scores[np.newaxis], k)
+        timings.append(time.perf_counter() - start)
+
+        hits = set(columns[actual >= relevant].tolist())
+        if hits:
+            precisions.append(len(hits.intersection(top[0].tolist())) / k)
+
+    errors = np.concatenate(errors)
+    return {
+        'mode': name,
+        'rmse': float(np.sqrt(np.mean(errors ** 2))),
+        f'precision@{k}': float(np.mean(precisions)),
+        'score_ms': float(np.mean(timings) * 1e3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare CF and matrix-factorisation recommenders.")
+    parser.add_argument('--ratings', default='ratings.csv')
+    parser.add_argument('--test-fraction', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--k', type=int, default=10, help="Cut-off for precision@k")
+    parser.add_argument('--relevant', type=float, default=4.0, help="Held-out rating counted as a hit")
+    parser.add_argument('--neighbours', type=int, default=50)
+    parser.add_argument('--factors', type=int, default=32)
+    parser.add_argument('--regularization', type=float, default=20.0)
+    parser.add_argument('--iterations', type=int, default=10)
+    args = parser.parse_args()
+
+    train, test = split_ratings(pd.read_csv(args.ratings), args.test_fraction, args.seed)
+    rating_matrix = RatingMatrix.from_ratings(train)
+
+    start = time.perf_counter()
+    neighbour_index = NeighbourIndex.build(rating_matrix, k=args.neighbours)
+    cf_train = time.perf_counter() - start
+
+    start = time.perf_counter()
+    factor_model = FactorModel.train(rating_matrix.matrix, factors=args.factors,
+                                     regularization=args.regularization, iterations=args.iterations,
+                                     seed=args.seed)
+    mf_train = time.perf_counter() - start
+
+    results = [
+        dict(evaluate('cf', lambda row: cf_scores(rating_matrix, neighbour_index, row),
+                      lambda row, cols: cf_predict(rating_matrix, neighbour_index, row, cols),
+                      rating_matrix, test, args.k, args.relevant), train_s=cf_train),
+        dict(evaluate('mf', lambda row: factor_model.scores(factor_model.user_factors[row]),
+                      lambda row, cols: factor_model.predict(np.full(len(cols), row), cols),
+                      rating_matrix, test, args.k, args.relevant), train_s=mf_train),
+    ]
+
+    print(f"{len(train)} train / {len(test)} test ratings")
+    print(f"{'mode':5s} {'train s':>8s} {'RMSE':>7s} {'P@' + str(args.k):>7s} {'score ms':>9s}")
+    for result in results:
+        print(f"{result['mode']:5s} {result['train_s']:8.2f} {result['rmse']:7.3f} "
+              f"{result[f'precision@{args.k}']:7.3f} {result['score_ms']:9.3f}")
+
+
+if __name__ == '__main__':
+    main()
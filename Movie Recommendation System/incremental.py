@@ -0,0 +1,360 @@
+import os
+import threading
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+from recommender import MovieCatalogue, NeighbourIndex
+from model_store import build_model, current_version, load_model, prune_versions, save_model
+
+LOG_HEADER = 'userId,movieId,rating,timestamp\n'
+
+
+class RatingLog:
+    """Append-only CSV log of rating deltas shared by every app worker.
+
+    Records are (userId, movieId, rating, timestamp) rows. Each batch is
+    written with a single O_APPEND write, so concurrent writers never
+    interleave lines, and readers only consume up to the last full line.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def append(self, records):
+        """Append (user_id, movie_id, rating[, timestamp]) records."""
+        lines = []
+        for record in records:
+            user_id, movie_id, rating = record[:3]
+            timestamp = record[3] if len(record) > 3 else int(time.time())
+            lines.append(f"{int(user_id)},{int(movie_id)},{float(rating)},{int(timestamp)}\n")
+        if not lines:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size == 0:
+                lines.insert(0, LOG_HEADER)
+            os.write(fd, ''.join(lines).encode())
+        finally:
+            os.close(fd)
+
+    def read(self, offset=0):
+        """Return the complete records after byte `offset` and the new offset."""
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return [], offset
+
+        end = data.rfind(b'\n') + 1
+        records = []
+        for line in data[:end].decode().splitlines():
+            if not line or line == LOG_HEADER.strip():
+                continue
+            user_id, movie_id, rating, timestamp = line.split(',')
+            records.append((int(user_id), int(movie_id), float(rating), int(timestamp)))
+        return records, offset + end
+
+
+class ModelState:
+    """A loaded model plus the rating deltas applied on top of it.
+
+    The artifact arrays stay read-only (and shared between workers); changed
+    users get their rating row, normalised row and neighbour list kept in
+    small per-row overlays. Applying a user's delta costs O(nnz) for the
+    fold-in similarity plus an O(users x K) vectorised scan to patch the
+    neighbour lists that gain or lose that user, never an O(users^2)
+    rebuild. A list in which a user drops out (or falls in rank) is not
+    refilled from outside its K entries until the next compaction.
+
+    Writers hold `_lock`; readers do not, since overlay entries are only
+    ever added or replaced whole and a new user's row is published last.
+    """
+
+    def __init__(self, model, log_offset=0):
+        self.model = model
+        self.version = model.version
+        self.log_offset = log_offset
+        self.movie_ids = model.rating_matrix.movie_ids
+        self.catalogue = MovieCatalogue(model.catalogue, self.movie_ids)
+        self.k = model.neighbour_index.k
+        self.min_similarity = model.neighbour_index.min_similarity
+        self.skipped = 0  # ratings for movies the model does not know yet
+
+        self._n_base = model.rating_matrix.shape[0]
+        self._new_users = {}   # user id -> row appended after the base rows
+        self._ratings = {}     # row -> current 1 x n_movies rating row
+        self._normalized = {}  # row -> unit-length rating row
+        self._neighbours = {}  # row -> (neighbour rows, similarities)
+        # (rows, stacked normalised rows, n_users) of every overlaid user
+        self._overlay = (np.empty(0, dtype=np.int64), None, self._n_base)
+        self._lock = threading.Lock()
+
+    @property
+    def n_users(self):
+        return self._n_base + len(self._new_users)
+
+    def user_ids(self):
+        """Ids of every user, base and newly ingested, in row order."""
+        return self.model.rating_matrix.user_ids.tolist() + list(self._new_users)
+
+    def user_row(self, user_id):
+        row = self.model.rating_matrix.user_row(user_id)
+        if row is None:
+            row = self._new_users.get(user_id)
+        return row
+
+    def user_vector(self, row):
+        vector = self._ratings.get(row)
+        if vector is None:
+            vector = self.model.rating_matrix.matrix[row]
+        return vector
+
+    def rated_columns(self, row):
+        return self.user_vector(row).indices
+
+    def preference_vector(self, preferences):
+        return self.model.rating_matrix.preference_vector(preferences)
+
+    def neighbours_of(self, row):
+        neighbours = self._neighbours.get(row)
+        if neighbours is None:
+            neighbours = self.model.neighbour_index.neighbours_of(row)
+        return neighbours
+
+    def neighbour_arrays(self, rows):
+        """K-padded (neighbours, similarities) arrays for several users.
+
+        Padding slots hold neighbour -1 and similarity 0, as in NeighbourIndex.
+        """
+        index = self.model.neighbour_index
+        base = np.minimum(rows, self._n_base - 1)
+        neighbours = np.array(index.neighbours[base], dtype=np.int64)
+        sims = np.array(index.similarities[base], dtype=np.float64)
+        for i, row in enumerate(rows.tolist()):
+            if row in self._neighbours:
+                overlay_rows, overlay_sims = self._neighbours[row]
+                neighbours[i] = -1
+                sims[i] = 0.0
+                neighbours[i, :len(overlay_rows)] = overlay_rows
+                sims[i, :len(overlay_sims)] = overlay_sims
+        return neighbours, sims
+
+    def factor_scores(self, row=None, vector=None):
+        """Matrix-factorisation scores for a known user `row` or a rating `vector`.
+
+        Users whose ratings changed since training, and preference vectors,
+        are folded in against the item factors.
+        """
+        factor_model = self.model.factor_model
+        if row is not None and row not in self._ratings:
+            user_factor = factor_model.user_factors[row]
+        else:
+            if vector is None:
+                vector = self.user_vector(row)
+            user_factor = factor_model.fold_in(vector.indices, vector.data)
+        return factor_model.scores(user_factor)
+
+    def fold_in_similarity(self, vector):
+        """Cosine similarity of `vector` with every user, deltas included."""
+        similarities = self.model.rating_matrix.fold_in_similarity(vector)
+        rows, normalized, n_users = self._overlay
+        if len(rows) == 0:
+            return similarities
+        similarities = np.concatenate([similarities, np.zeros(n_users - self._n_base)])
+        norm = np.sqrt(vector.data.dot(vector.data))
+        if norm > 0:
+            similarities[rows] = normalized.dot(vector.T).toarray().ravel() / norm
+        return similarities
+
+    def user_vectors(self, rows):
+        """Rating rows of several users as one CSR matrix."""
+        if any(int(row) in self._ratings for row in rows):
+            return sp.vstack([self.user_vector(int(row)) for row in rows], format='csr')
+        return self.model.rating_matrix.matrix[rows]
+
+    def weighted_scores(self, weights, rows):
+        return self.user_vectors(rows).T.dot(weights) / weights.sum()
+
+    def apply(self, records):
+        """Apply (user_id, movie_id, rating[, timestamp]) records in order.
+
+        Returns the ids of the users whose recommendations may have changed:
+        the users who rated, plus every user whose neighbour list held or
+        now holds one of them.
+        """
+        changes = {}
+        for record in records:
+            user_id, movie_id, rating = record[:3]
+            column = self.model.rating_matrix.movie_column(movie_id)
+            if column is None:
+                self.skipped += 1
+                continue
+            changes.setdefault(user_id, {})[column] = float(rating)
+
+        affected = set()
+        with self._lock:
+            for user_id, user_changes in changes.items():
+                affected |= self._update_user(user_id, user_changes)
+            user_ids = self.user_ids()
+        return [user_ids[row] for row in sorted(affected)]
+
+    def _update_user(self, user_id, changes):
+        row = self.user_row(user_id)
+        is_new = row is None
+        if is_new:
+            row = self.n_users
+            ratings = {}
+        else:
+            vector = self.user_vector(row)
+            ratings = dict(zip(vector.indices.tolist(), vector.data.tolist()))
+        ratings.update(changes)
+
+        columns = np.array(sorted(ratings), dtype=np.int32)
+        values = np.array([ratings[c] for c in columns.tolist()])
+        shape = (1, len(self.movie_ids))
+        vector = sp.csr_matrix((values, columns, [0, len(columns)]), shape=shape)
+        self._ratings[row] = vector
+        norm = np.sqrt(values.dot(values))
+        self._normalized[row] = vector / (norm if norm > 0 else 1.0)
+        overlay_rows = np.fromiter(self._normalized, dtype=np.int64)
+        stacked = sp.vstack([self._normalized[r] for r in overlay_rows.tolist()], format='csr')
+        self._overlay = (overlay_rows, stacked, max(self.n_users, row + 1))
+
+        similarities = self.fold_in_similarity(vector)
+        similarities[row] = -np.inf
+        rows, sims = NeighbourIndex.top_k(similarities, self.k, self.min_similarity)
+        self._neighbours[row] = (rows, sims.astype(np.float64))
+        # Publish a new row only once its overlays are in place, and before
+        # any other list can point at it, so lock-free readers never look it
+        # up in the base arrays.
+        if is_new:
+            self._new_users[user_id] = row
+        return {row} | self._update_reverse_neighbours(row, similarities)
+
+    def _update_reverse_neighbours(self, user_row, similarities):
+        """Patch the neighbour lists whose membership depends on `user_row`.
+
+        Returns the rows whose list held or now holds `user_row`.
+        """
+        if self.k == 0:
+            return set()
+        index = self.model.neighbour_index
+        neighbours, sims = index.neighbours, index.similarities
+        kth = np.where(neighbours[:, -1] >= 0, sims[:, -1], self.min_similarity)
+        affected = (neighbours == user_row).any(axis=1) | (similarities[:self._n_base] > kth)
+        candidates = set(np.flatnonzero(affected).tolist()) - set(self._neighbours)
+
+        for row, (rows, row_sims) in list(self._neighbours.items()):
+            row_kth = row_sims[-1] if len(rows) == self.k else self.min_similarity
+            if (rows == user_row).any() or similarities[row] > row_kth:
+                candidates.add(row)
+        candidates.discard(user_row)
+
+        for row in candidates:
+            rows, row_sims = self.neighbours_of(row)
+            keep = rows != user_row
+            rows, row_sims = rows[keep], row_sims[keep]
+            if similarities[row] > self.min_similarity:
+                rows = np.append(rows, user_row).astype(np.int32)
+                row_sims = np.append(row_sims, similarities[row])
+            order = np.argsort(-row_sims, kind='stable')[:self.k]
+            self._neighbours[row] = (rows[order], row_sims[order])
+        return candidates
+
+
+class LiveModel:
+    """Serves the current artifact and keeps it fresh.
+
+    Every `refresh_interval` seconds `current()` picks up new lines from the
+    shared rating log and, when a compaction has produced a new artifact,
+    swaps to it. Requests should take one `current()` snapshot and use it
+    throughout so a swap never mixes rows from two models.
+
+    Callbacks registered with `on_change` are called with the ids of the
+    users affected by each applied batch of deltas, or None after a swap.
+    """
+
+    def __init__(self, model, model_dir, log_path, refresh_interval=2.0):
+        self.model_dir = model_dir
+        self.log = RatingLog(log_path)
+        self.refresh_interval = refresh_interval
+        self._state = ModelState(model, model.meta.get('log_offset', 0))
+        self._refresh_lock = threading.Lock()
+        self._last_refresh = 0.0
+        self._listeners = []
+        self.refresh(force=True)
+
+    def on_change(self, callback):
+        self._listeners.append(callback)
+
+    def current(self):
+        self.refresh()
+        return self._state
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_refresh < self.refresh_interval:
+            return []
+        if not self._refresh_lock.acquire(blocking=force):
+            return []  # another thread is already refreshing
+        try:
+            self._last_refresh = now
+            version = current_version(self.model_dir)
+            if version and version != self._state.version:
+                model = load_model(self.model_dir, version)
+                state = ModelState(model, model.meta.get('log_offset', 0))
+                self._catch_up(state)
+                self._state = state
+                changed = None  # everything changed
+            else:
+                changed = self._catch_up(self._state)
+        finally:
+            self._refresh_lock.release()
+
+        if changed is None or changed:
+            for callback in self._listeners:
+                callback(changed)
+        return changed
+
+    def ingest(self, records):
+        """Append rating deltas to the shared log and apply them right away.
+
+        Returns the ids of the users whose recommendations may have changed,
+        or None if a new artifact was swapped in at the same time.
+        """
+        self.log.append(records)
+        return self.refresh(force=True)
+
+    def _catch_up(self, state):
+        records, offset = self.log.read(state.log_offset)
+        changed = state.apply(records)
+        state.log_offset = offset
+        return changed
+
+
+def compact(model_dir, log_path, ratings_path, movies_path, k=50, min_similarity=0.0, factors=0,
+            keep=3, **factor_params):
+    """Full rebuild from ratings.csv plus every logged delta.
+
+    The new artifact records how much of the log it already contains, so
+    workers that swap to it only replay the deltas written afterwards.
+    Once it is current, all but the `keep` newest artifacts are deleted.
+    """
+    import pandas as pd
+
+    log = RatingLog(log_path)
+    records, offset = log.read(0)
+    ratings = pd.read_csv(ratings_path)
+    if records:
+        deltas = pd.DataFrame(records, columns=['userId', 'movieId', 'rating', 'timestamp'])
+        ratings = pd.concat([ratings, deltas], ignore_index=True)
+
+    model = build_model(ratings, pd.read_csv(movies_path), k=k, min_similarity=min_similarity,
+                        factors=factors, **factor_params)
+    version = save_model(model_dir, model, extra_meta={'log_offset': offset})
+    prune_versions(model_dir, keep)
+    return version
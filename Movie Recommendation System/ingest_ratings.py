@@ -0,0 +1,66 @@
+"""Feed rating deltas to the movie recommender without restarting it.
+
+    python ingest_ratings.py append new_ratings.csv   # userId,movieId,rating[,timestamp]
+    python ingest_ratings.py compact                  # full rebuild including the log
+    python ingest_ratings.py compact --every 3600     # ... once an hour
+
+Appended ratings land in the shared log and are picked up by every running
+app worker within a few seconds. Compaction rebuilds the artifact from
+ratings.csv plus the log; workers swap to it on their next refresh, and
+only the newest --keep artifacts stay on disk.
+"""
+import argparse
+import csv
+import os
+import time
+
+from incremental import RatingLog, compact
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest rating deltas into the movie recommender.")
+    parser.add_argument('--model', default='model', help="Artifact directory")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    append_parser = subparsers.add_parser('append', help="Append ratings from a CSV file to the log")
+    append_parser.add_argument('file', help="CSV with userId,movieId,rating[,timestamp] columns")
+
+    compact_parser = subparsers.add_parser('compact', help="Rebuild the artifact including all logged ratings")
+    compact_parser.add_argument('--movies', default='movies.csv')
+    compact_parser.add_argument('--ratings', default='ratings.csv')
+    compact_parser.add_argument('--neighbours', type=int, default=50)
+    compact_parser.add_argument('--min-similarity', type=float, default=0.0)
+    compact_parser.add_argument('--factors', type=int, default=32)
+    compact_parser.add_argument('--regularization', type=float, default=20.0, help="ALS L2 regularisation")
+    compact_parser.add_argument('--iterations', type=int, default=10, help="ALS iterations")
+    compact_parser.add_argument('--keep', type=int, default=3,
+                                help="Artifacts kept on disk, older ones are deleted after each compaction")
+    compact_parser.add_argument('--every', type=float, default=None,
+                                help="Keep running and compact every N seconds")
+    args = parser.parse_args()
+
+    log_path = os.path.join(args.model, 'ratings_log.csv')
+    if args.command == 'append':
+        with open(args.file, newline='') as f:
+            records = [
+                (row['userId'], row['movieId'], row['rating'], row.get('timestamp') or int(time.time()))
+                for row in csv.DictReader(f)
+            ]
+        RatingLog(log_path).append(records)
+        print(f"Appended {len(records)} ratings to {log_path}")
+        return
+
+    while True:
+        start = time.perf_counter()
+        version = compact(args.model, log_path, args.ratings, args.movies,
+                          k=args.neighbours, min_similarity=args.min_similarity,
+                          factors=args.factors, keep=args.keep, regularization=args.regularization,
+                          iterations=args.iterations)
+        print(f"Compacted into model {version} in {time.perf_counter() - start:.1f}s")
+        if args.every is None:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import numpy as np
+
+
+class FactorModel:
+    """Latent-factor recommender trained with alternating least squares.
+
+    A rating is predicted as `global_mean + user_factor . item_factor`, so
+    scoring a user is one (n_movies x f) @ (f,) product no matter how many
+    users there are. Users without a stored factor (new or changed since
+    training) are folded in by solving a small f x f least-squares system
+    against the fixed item factors.
+
+    :param user_factors: n_users x f array, one row per rating-matrix row.
+    :param item_factors: n_movies x f array, one row per rating column.
+    :param global_mean: mean of the training ratings.
+    :param regularization: L2 weight on every factor. A fixed (rather than
+        per-rating) penalty shrinks rarely rated movies harder, which keeps
+        them from dominating the top-N lists.
+    """
+
+    def __init__(self, user_factors, item_factors, global_mean, regularization):
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.global_mean = global_mean
+        self.regularization = regularization
+
+    @property
+    def factors(self):
+        return self.item_factors.shape[1]
+
+    @classmethod
+    def train(cls, matrix, factors=32, regularization=20.0, iterations=10, seed=0):
+        """Fit factors to the observed entries of a CSR rating matrix."""
+        rng = np.random.default_rng(seed)
+        n_users, n_movies = matrix.shape
+        global_mean = float(matrix.data.mean()) if matrix.nnz else 0.0
+        user_factors = rng.normal(0, 0.1, (n_users, factors))
+        item_factors = rng.normal(0, 0.1, (n_movies, factors))
+        by_movie = matrix.T.tocsr()
+
+        for _ in range(iterations):
+            user_factors = _solve_rows(matrix, item_factors, regularization, global_mean)
+            item_factors = _solve_rows(by_movie, user_factors, regularization, global_mean)
+        return cls(user_factors, item_factors, global_mean, regularization)
+
+    def fold_in(self, columns, values):
+        """Factor of a user with `values` ratings for movie `columns`."""
+        return _solve(self.item_factors[columns], np.asarray(values) - self.global_mean,
+                      self.regularization)
+
+    def scores(self, user_factor):
+        """Predicted rating of every movie for one user factor."""
+        return self.global_mean + self.item_factors.dot(user_factor)
+
+    def predict(self, rows, columns):
+        """Predicted ratings for (row, column) pairs of known users."""
+        user_factors = self.user_factors[rows]
+        item_factors = self.item_factors[columns]
+        return self.global_mean + np.einsum('ij,ij->i', user_factors, item_factors)
+
+
+def _solve(fixed, residuals, regularization):
+    gram = fixed.T.dot(fixed)
+    gram[np.diag_indices_from(gram)] += regularization
+    return np.linalg.solve(gram, fixed.T.dot(residuals))
+
+
+def _solve_rows(matrix, fixed, regularization, global_mean):
+    """One ALS half-step: refit every row of `matrix` against `fixed`."""
+    solved = np.zeros((matrix.shape[0], fixed.shape[1]))
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        if start == end:
+            continue
+        columns = matrix.indices[start:end]
+        solved[row] = _solve(fixed[columns], matrix.data[start:end] - global_mean, regularization)
+    return solved
+
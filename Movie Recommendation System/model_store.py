@@ -0,0 +1,196 @@
+import json
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+import scipy.sparse as sp
+
+from recommender import RatingMatrix, NeighbourIndex
+from matrix_factorization import FactorModel
+
+# Bump when the on-disk layout changes; older artifacts are then rejected.
+FORMAT_VERSION = 1
+CURRENT_FILE = 'CURRENT'
+META_FILE = 'meta.json'
+
+
+class RecommenderModel:
+    """Everything the movie app needs to serve recommendations.
+
+    :param rating_matrix: sparse ratings plus normalised user vectors.
+    :param neighbour_index: top-K neighbours of every user.
+    :param catalogue: dict of parallel `movieId` / `title` / `genres` arrays
+        in movies.csv order.
+    :param version: artifact version this model was loaded from, if any.
+    :param meta: contents of the artifact's meta.json.
+    :param factor_model: optional matrix-factorisation model over the same
+        users and movies.
+    """
+
+    def __init__(self, rating_matrix, neighbour_index, catalogue, version=None, meta=None,
+                 factor_model=None):
+        self.rating_matrix = rating_matrix
+        self.neighbour_index = neighbour_index
+        self.catalogue = catalogue
+        self.factor_model = factor_model
+        self.version = version
+        self.meta = meta or {}
+
+
+def build_model(ratings, movies, k=50, min_similarity=0.0, factors=0, **factor_params):
+    """Build a model from the ratings and movies DataFrames.
+
+    With `factors` > 0 a FactorModel with that many latent factors is
+    trained as well; `factor_params` go to FactorModel.train.
+    """
+    rating_matrix = RatingMatrix.from_ratings(ratings)
+    neighbour_index = NeighbourIndex.build(rating_matrix, k=k, min_similarity=min_similarity)
+    factor_model = None
+    if factors > 0:
+        factor_model = FactorModel.train(rating_matrix.matrix, factors=factors, **factor_params)
+    catalogue = {
+        'movieId': movies['movieId'].to_numpy(dtype=np.int64),
+        'title': movies['title'].to_numpy(dtype=str),
+        'genres': movies['genres'].to_numpy(dtype=str),
+    }
+    return RecommenderModel(rating_matrix, neighbour_index, catalogue, factor_model=factor_model)
+
+
+def save_model(root, model, extra_meta=None):
+    """Write `model` as a new versioned artifact under `root` and make it current.
+
+    Each build goes to its own `root/<version>/` directory of .npy files. The
+    `CURRENT` pointer is swapped atomically once every file is written, so a
+    worker starting mid-build still maps a complete artifact.
+    """
+    version = time.strftime("%Y%m%dT%H%M%S", time.gmtime()) + '-' + uuid.uuid4().hex[:8]
+    path = os.path.join(root, version)
+    os.makedirs(path)
+
+    rating_matrix = model.rating_matrix
+    _save_csr(path, 'ratings', rating_matrix.matrix)
+    _save_csr(path, 'normalized', rating_matrix.normalized)
+    _save_csr(path, 'normalized_by_movie', rating_matrix.normalized_by_movie)
+    np.save(os.path.join(path, 'user_ids.npy'), rating_matrix.user_ids)
+    np.save(os.path.join(path, 'movie_ids.npy'), rating_matrix.movie_ids)
+    np.save(os.path.join(path, 'neighbours.npy'), model.neighbour_index.neighbours)
+    np.save(os.path.join(path, 'neighbour_similarities.npy'), model.neighbour_index.similarities)
+    for field, values in model.catalogue.items():
+        np.save(os.path.join(path, f'catalogue_{field}.npy'), values)
+    factor_meta = None
+    if model.factor_model is not None:
+        np.save(os.path.join(path, 'user_factors.npy'), model.factor_model.user_factors)
+        np.save(os.path.join(path, 'item_factors.npy'), model.factor_model.item_factors)
+        factor_meta = {
+            'factors': model.factor_model.factors,
+            'global_mean': model.factor_model.global_mean,
+            'regularization': model.factor_model.regularization,
+        }
+
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'version': version,
+        'n_users': int(rating_matrix.shape[0]),
+        'n_movies': int(rating_matrix.shape[1]),
+        'n_ratings': int(rating_matrix.matrix.nnz),
+        'neighbours_k': int(model.neighbour_index.k),
+        'min_similarity': float(model.neighbour_index.min_similarity),
+        'catalogue_fields': list(model.catalogue),
+        'factor_model': factor_meta,
+        **(extra_meta or {}),
+    }
+    with open(os.path.join(path, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    pointer = os.path.join(root, CURRENT_FILE)
+    with open(pointer + '.tmp', 'w') as f:
+        f.write(version)
+    os.replace(pointer + '.tmp', pointer)
+    model.version = version
+    model.meta = meta
+    return version
+
+
+def current_version(root):
+    """Return the version named by `root/CURRENT`, or None if nothing was built."""
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def prune_versions(root, keep=3):
+    """Delete all but the `keep` newest artifacts under `root`; return the versions removed.
+
+    The current artifact is always kept. Workers still mapping a removed
+    one keep serving it until they swap, since an open mapping outlives
+    its file.
+    """
+    current = current_version(root)
+    metas = {name: os.path.join(root, name, META_FILE) for name in os.listdir(root)}
+    # Oldest first; meta.json is written last, and names only order to the second
+    versions = sorted((name for name, meta in metas.items() if os.path.isfile(meta)),
+                      key=lambda name: (os.path.getmtime(metas[name]), name))
+    older = versions[:-keep] if keep > 0 else versions
+    removed = [version for version in older if version != current]
+    for version in removed:
+        shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+    return removed
+
+
+def load_model(root, version=None, mmap=True):
+    """Map an artifact from `root` (the current one unless `version` is given).
+
+    With `mmap` the arrays are opened read-only with np.load(mmap_mode='r'),
+    so loading is O(1) and forked workers share the pages through the OS
+    page cache instead of each holding a private copy.
+    """
+    version = version or current_version(root)
+    if version is None:
+        raise FileNotFoundError(f"No model artifact found in {root!r}")
+    path = os.path.join(root, version)
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    if meta['format_version'] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported model format {meta['format_version']} in {path!r}")
+
+    mmap_mode = 'r' if mmap else None
+
+    def load(name):
+        return np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+
+    shape = (meta['n_users'], meta['n_movies'])
+    rating_matrix = RatingMatrix(
+        _load_csr(load, 'ratings', shape),
+        load('user_ids'),
+        load('movie_ids'),
+        normalized=_load_csr(load, 'normalized', shape),
+        normalized_by_movie=_load_csr(load, 'normalized_by_movie', shape[::-1]),
+    )
+    neighbour_index = NeighbourIndex(
+        load('neighbours'), load('neighbour_similarities'),
+        meta['neighbours_k'], meta['min_similarity'],
+    )
+    catalogue = {field: load(f'catalogue_{field}') for field in meta['catalogue_fields']}
+    factor_model = None
+    if meta.get('factor_model'):
+        factor_model = FactorModel(
+            load('user_factors'), load('item_factors'),
+            meta['factor_model']['global_mean'], meta['factor_model']['regularization'],
+        )
+    return RecommenderModel(rating_matrix, neighbour_index, catalogue, version=version, meta=meta,
+                            factor_model=factor_model)
+
+
+def _save_csr(path, name, matrix):
+    np.save(os.path.join(path, f'{name}_indptr.npy'), matrix.indptr)
+    np.save(os.path.join(path, f'{name}_indices.npy'), matrix.indices)
+    np.save(os.path.join(path, f'{name}_data.npy'), matrix.data)
+
+
+def _load_csr(load, name, shape):
+    arrays = (load(f'{name}_data'), load(f'{name}_indices'), load(f'{name}_indptr'))
+    return sp.csr_matrix(arrays, shape=shape, copy=False)
@@ -0,0 +1,216 @@
+import numpy as np
+import scipy.sparse as sp
+
+
+def _find(sorted_ids, value):
+    i = int(np.searchsorted(sorted_ids, value))
+    if i < len(sorted_ids) and sorted_ids[i] == value:
+        return i
+    return None
+
+
+def top_n(scores, n):
+    """The N best-scoring columns of every row of a 2-D score array, best first.
+
+    Uses partial selection (the N-th best score per row, then ranking only
+    the entries at or above it) instead of sorting whole rows; ties go to
+    the lower column. Returns (columns, scores); slots without a finite
+    score hold column -1 and score -inf.
+    """
+    n_rows, n_cols = scores.shape
+    n = min(n, n_cols)
+    columns = np.full((n_rows, n), -1, dtype=np.int64)
+    best = np.full((n_rows, n), -np.inf)
+    if n == 0:
+        return columns, best
+
+    costs = np.negative(scores, order='C')  # also makes row-major copies contiguous
+    kth = np.partition(costs, n - 1, axis=1)[:, n - 1:n]
+    rows, cols = np.nonzero(costs <= kth)
+    cand_costs = costs[rows, cols]
+    order = np.lexsort((cols, cand_costs, rows))
+    rows, cols, cand_costs = rows[order], cols[order], cand_costs[order]
+    rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+    keep = (rank < n) & np.isfinite(cand_costs)
+    columns[rows[keep], rank[keep]] = cols[keep]
+    best[rows[keep], rank[keep]] = -cand_costs[keep]
+    return columns, best
+
+
+class MovieCatalogue:
+    """Movie titles as contiguous arrays keyed by dense movie column.
+
+    `titles[c]` is the title of rating column `c`, so turning a ranked list
+    of columns into records is O(N) and keeps the ranking order.
+
+    :param catalogue: dict of parallel `movieId` / `title` / `genres` arrays.
+    :param movie_ids: sorted movie id of every rating column.
+    """
+
+    def __init__(self, catalogue, movie_ids):
+        self.catalogue = catalogue
+        self.movie_ids = movie_ids
+        order = np.argsort(catalogue['movieId'], kind='stable')
+        sorted_ids = catalogue['movieId'][order]
+        positions = np.minimum(np.searchsorted(sorted_ids, movie_ids), len(sorted_ids) - 1)
+        found = sorted_ids[positions] == movie_ids
+        self.titles = np.where(found, catalogue['title'][order[positions]], '')
+
+    def records(self, columns):
+        """[{'movieId', 'title'}, ...] for rating columns, in the given order."""
+        return [
+            {'movieId': self.movie_ids[c].item(), 'title': str(self.titles[c])}
+            for c in columns
+        ]
+
+    def sample(self, n, fields=('movieId', 'title', 'genres')):
+        """Records of `n` random catalogue movies (rated or not)."""
+        positions = np.random.choice(len(self.catalogue['movieId']), n, replace=False)
+        return [{field: self.catalogue[field][i].item() for field in fields} for i in positions]
+
+
+class RatingMatrix:
+    """Sparse user x movie rating store.
+
+    Ratings are kept as a CSR matrix, so memory grows with the number of
+    ratings rather than with users x movies. Users and movies are mapped to
+    dense row/column indexes through `user_ids` / `movie_ids`.
+
+    L2-normalised user vectors are precomputed once, so a new preference
+    vector can be folded in and scored against every user without touching
+    (or copying) the stored ratings. The store is read-only after
+    construction and can be shared between request threads.
+    """
+
+    def __init__(self, matrix, user_ids, movie_ids, normalized=None, normalized_by_movie=None):
+        self.matrix = sp.csr_matrix(matrix, dtype=np.float64)
+        # Both id arrays are sorted, so lookups are a binary search and no
+        # per-id dict has to be built at startup.
+        self.user_ids = np.asarray(user_ids)
+        self.movie_ids = np.asarray(movie_ids)
+
+        # Unit-length user vectors, stored movie-major so a fold-in only reads
+        # the columns of the movies the new user actually rated.
+        if normalized is None:
+            norms = np.sqrt(self.matrix.multiply(self.matrix).sum(axis=1)).A.ravel()
+            norms[norms == 0] = 1.0
+            normalized = sp.diags(1.0 / norms).dot(self.matrix)
+        self.normalized = sp.csr_matrix(normalized)
+        if normalized_by_movie is None:
+            normalized_by_movie = self.normalized.T.tocsr()
+        self.normalized_by_movie = sp.csr_matrix(normalized_by_movie)
+
+    @classmethod
+    def from_ratings(cls, ratings):
+        """Build the store from a ratings DataFrame (userId, movieId, rating)."""
+        ratings = ratings.drop_duplicates(subset=['userId', 'movieId'], keep='last')
+        user_ids, rows = np.unique(ratings['userId'].to_numpy(), return_inverse=True)
+        movie_ids, cols = np.unique(ratings['movieId'].to_numpy(), return_inverse=True)
+        values = ratings['rating'].to_numpy(dtype=np.float64)
+        matrix = sp.csr_matrix((values, (rows, cols)), shape=(len(user_ids), len(movie_ids)))
+        return cls(matrix, user_ids, movie_ids)
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    def user_row(self, user_id):
+        """Return the row index of `user_id`, or None if the user is unknown."""
+        return _find(self.user_ids, user_id)
+
+    def movie_column(self, movie_id):
+        """Return the column index of `movie_id`, or None if it was never rated."""
+        return _find(self.movie_ids, movie_id)
+
+    def rated_columns(self, row):
+        """Column indexes of the movies rated by the user in `row`."""
+        start, end = self.matrix.indptr[row], self.matrix.indptr[row + 1]
+        return self.matrix.indices[start:end]
+
+    def preference_vector(self, preferences):
+        """Turn a {movieId: rating} dict into a 1 x n_movies sparse row.
+
+        Movies that do not appear in the rating data are ignored.
+        """
+        cols, values = [], []
+        for movie_id, rating in preferences.items():
+            col = self.movie_column(movie_id)
+            if col is not None:
+                cols.append(col)
+                values.append(float(rating))
+        return sp.csr_matrix((values, ([0] * len(cols), cols)), shape=(1, self.shape[1]))
+
+    def fold_in_similarity(self, vector):
+        """Cosine similarity between a 1 x n_movies sparse row and every user.
+
+        Costs O(nnz) of the rated movie columns; nothing shared is modified.
+        """
+        norm = np.sqrt(vector.data.dot(vector.data))
+        if norm == 0:
+            return np.zeros(self.shape[0])
+        columns = self.normalized_by_movie[vector.indices]
+        return columns.T.dot(vector.data / norm)
+
+    def weighted_scores(self, weights, rows=None):
+        """Similarity-weighted average rating of every movie.
+
+        :param weights: similarity weight of each user row used.
+        :param rows: user rows the weights belong to; all users if None.
+        """
+        matrix = self.matrix if rows is None else self.matrix[rows]
+        return matrix.T.dot(weights) / weights.sum()
+
+
+class NeighbourIndex:
+    """Top-K most similar users for every user.
+
+    Only K neighbour rows and similarities are kept per user, so memory is
+    O(users x K) instead of a full users x users similarity matrix. Slots
+    with no neighbour (fewer than K users above `min_similarity`) hold -1.
+    """
+
+    def __init__(self, neighbours, similarities, k, min_similarity):
+        self.neighbours = neighbours
+        self.similarities = similarities
+        self.k = k
+        self.min_similarity = min_similarity
+
+    @classmethod
+    def build(cls, rating_matrix, k=50, min_similarity=0.0, block_size=256):
+        """Exact top-K search, computed `block_size` users at a time."""
+        n_users = rating_matrix.shape[0]
+        k = min(k, max(n_users - 1, 0))
+        neighbours = np.full((n_users, k), -1, dtype=np.int32)
+        similarities = np.zeros((n_users, k), dtype=np.float32)
+        normalized = rating_matrix.normalized
+        normalized_t = normalized.T.tocsc()
+
+        for start in range(0, n_users, block_size):
+            end = min(start + block_size, n_users)
+            block = normalized[start:end].dot(normalized_t).toarray()
+            block[np.arange(end - start), np.arange(start, end)] = -np.inf  # skip self
+            for offset, sims in enumerate(block):
+                rows, top = cls.top_k(sims, k, min_similarity)
+                neighbours[start + offset, :len(rows)] = rows
+                similarities[start + offset, :len(rows)] = top
+
+        return cls(neighbours, similarities, k, min_similarity)
+
+    @staticmethod
+    def top_k(similarities, k, min_similarity=0.0):
+        """Rows and values of the K largest similarities above the floor, best first."""
+        if k <= 0:
+            return np.empty(0, dtype=np.int32), np.empty(0)
+        if k < len(similarities):
+            rows = np.argpartition(-similarities, k - 1)[:k]
+        else:
+            rows = np.arange(len(similarities))
+        rows = rows[np.argsort(-similarities[rows], kind='stable')]
+        rows = rows[similarities[rows] > min_similarity]
+        return rows.astype(np.int32), similarities[rows]
+
+    def neighbours_of(self, row):
+        """Neighbour rows and similarities of the user in `row`."""
+        rows = self.neighbours[row]
+        valid = rows >= 0
+        return rows[valid], self.similarities[row][valid].astype(np.float64)
@@ -0,0 +1,87 @@
+import queue
+import sqlite3
+from contextlib import contextmanager
+
+SCHEMA = '''CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL,
+                email TEXT UNIQUE NOT NULL,
+                password TEXT NOT NULL
+            )'''
+
+# Fixed SQL strings, so each connection's statement cache keeps them prepared
+INSERT_USER = "INSERT INTO users (username, email, password) VALUES (?, ?, ?)"
+FIND_BY_EMAIL = "SELECT id, username, password FROM users WHERE email = ?"
+
+
+class UserStore:
+    """Data access for the users table.
+
+    Requests borrow an open connection from a shared pool instead of
+    connecting each time. The pool is not tied to threads, because Flask's
+    development server starts a new thread for every request. Up to
+    `pool_size` idle connections are kept; extra ones opened under load are
+    closed when they are returned. Connections run in WAL mode, so logins
+    read while a registration writes, and wait up to `busy_timeout_ms` for
+    a lock instead of failing straight away. Email lookups use the index
+    SQLite builds for the UNIQUE constraint.
+    """
+
+    def __init__(self, path='users.db', busy_timeout_ms=5000, pool_size=8):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.pool_size = pool_size
+        self._idle = queue.LifoQueue()  # most recently used first, its pages still cached
+
+    @contextmanager
+    def connection(self):
+        """An open connection for the duration of the block, returned to the pool after it."""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            if self._idle.qsize() < self.pool_size:
+                self._idle.put(conn)
+            else:
+                conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, cached_statements=64,
+                               check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL would be safe against corruption but could lose the last
+        # registrations on power loss; in WAL mode FULL only syncs on commit
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        return conn
+
+    def init_schema(self):
+        with self.connection() as conn:
+            conn.execute(SCHEMA)
+            conn.commit()
+
+    def add_user(self, username, email, password_hash):
+        """Insert a user; returns False if the email is already registered."""
+        with self.connection() as conn:
+            try:
+                with conn:
+                    conn.execute(INSERT_USER, (username, email, password_hash))
+                return True
+            except sqlite3.IntegrityError:
+                return False
+
+    def find_by_email(self, email):
+        """(id, username, password hash) of the user with `email`, or None."""
+        with self.connection() as conn:
+            return conn.execute(FIND_BY_EMAIL, (email,)).fetchone()
+
+    def close(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
@@ -1,10 +1,15 @@
-from flask import Flask, render_template, Response
+from flask import Flask, render_template, Response, jsonify, session, request
 import cv2
 from deepface import DeepFace
-from emotion_model import detect_emotion 
+from emotion_model import get_engine
+from emotion_worker import EmotionWorker, CAMERA
 import random
+import uuid
+import numpy as np
 
 app = Flask(__name__)
+app.secret_key = 'your_secret_key'  # Secret key for session management
+app.config['MAX_CONTENT_LENGTH'] = 1024 * 1024  # uploaded frames are a few KB
 
 # Load emotion-to-song mapping
 music_recommendations = {
@@ -56,7 +61,26 @@ def recommend_song(emotion, song_data):
         return ["No recommendation available."]
 
 
+# Load the emotion model now rather than on the first frame
+get_engine()
+
 cap = cv2.VideoCapture(0)
+# Reads the camera and runs the emotion model in the background; routes only read the latest result.
+# Every listener (browser session) gets its own smoothing; their frames are classified in batches.
+emotion_worker = EmotionWorker(cap).start()
+
+
+def listener_id():
+    # Identifies this browser's emotion state in the worker
+    if 'listener' not in session:
+        session['listener'] = uuid.uuid4().hex
+    return session['listener']
+
+
+def listener_emotion():
+    # The listener's own emotion once they have sent frames, else the server camera's
+    return emotion_worker.latest(listener_id()) or emotion_worker.latest(CAMERA)
+
 @app.route("/")
 def home():
     return render_template("home.html")
@@ -64,19 +88,57 @@ def home():
 
 @app.route('/r')
 def r():
-    # Capture emotion and recommend music
-    _, frame = cap.read()
-    detected_emotion = detect_emotion(frame)  # Use your existing emotion detection model
+    # Latest emotion from the background worker (age = seconds since it was detected)
+    state = listener_emotion()
+    detected_emotion = state["emotion"]
     
     # Fetch the music recommendations based on detected emotion
     recommendations = music_recommendations.get(detected_emotion, music_recommendations['neutral'])
 
-    return render_template('r.html', emotion=detected_emotion, recommendations=recommendations)
+    return render_template('r.html', emotion=detected_emotion, recommendations=recommendations,
+                           updated_at=state["updated_at"], age=state["age"])
+
+@app.route('/emotion')
+def emotion():
+    return jsonify(listener_emotion())
+
+@app.route('/emotion/stats')
+def emotion_stats():
+    return jsonify(emotion_worker.stats())
+
+# Frames from the browser's own camera, for when it is not on the server.
+# Body: a small JPEG/PNG/WebP (raw, or a multipart 'frame' field), or with
+# ?format=gray&width=&height= the raw 8-bit grey pixels. Add ?face=1 when the
+# image is already cropped to the face (e.g. a 48x48 thumbnail).
+@app.route('/frames', methods=['POST'])
+def upload_frame():
+    data = request.files['frame'].read() if 'frame' in request.files else request.get_data()
+    if not data:
+        return jsonify({'error': 'empty frame'}), 400
+    buffer = np.frombuffer(data, np.uint8)  # no copy of the request body
+    if request.args.get('format') == 'gray':
+        width, height = request.args.get('width', 48, type=int), request.args.get('height', 48, type=int)
+        if not (0 < width <= 1024 and 0 < height <= 1024) or buffer.size != width * height:
+            return jsonify({'error': f'expected {width}x{height} = {width * height} grey bytes'}), 400
+        frame = buffer.reshape(height, width)
+    else:
+        # Always 8-bit BGR, whatever the depth or channels of the upload
+        frame = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+        if frame is None:
+            return jsonify({'error': 'expected a JPEG, PNG or WebP image'}), 400
+    face = request.args.get('face', '0') not in ('0', 'false', '')
+    emotion_worker.submit(frame, listener_id(), face=face)
+    # The result of an earlier frame; this one is analysed in the background
+    return jsonify(listener_emotion())
 
 @app.route('/video_feed')
 def video_feed():
     # Function to stream the video feed
-    _, frame = cap.read()
+    frame = emotion_worker.latest_frame(listener_id())
+    if frame is None:
+        frame = emotion_worker.latest_frame()
+    if frame is None:
+        return Response(status=503)
     ret, jpeg = cv2.imencode('.jpg', frame)
     return Response(jpeg.tobytes(), mimetype='image/jpeg')
 @app.route("/about")
@@ -0,0 +1,80 @@
+"""Frames per second of the warm EmotionEngine against per-call DeepFace.analyze.
+
+    python bench_emotion.py face_clip.mp4 --limit 300
+
+Runs the original path (DeepFace.analyze on every full frame) and the
+EmotionEngine (model loaded once, face tracked between frames, only the
+face crop classified) over a recorded clip, and reports frames per
+second, how often the engine had to search the whole frame for the face,
+and how often both agree on the dominant emotion.
+"""
+import argparse
+import time
+
+import cv2
+from deepface import DeepFace
+
+from emotion_model import EMOTIONS, EmotionEngine
+
+
+def legacy_analyze(frame):
+    """emotion_model.detect_emotion as it was, without the smoothing."""
+    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    analysis = DeepFace.analyze(frame_rgb, actions=['emotion'], enforce_detection=False)
+    return analysis[0]["emotion"] if isinstance(analysis, list) else analysis["emotion"]
+
+
+def read_clip(path, limit):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def dominant(emotions):
+    return None if emotions is None else max(emotions, key=emotions.get)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark emotion detection per frame.")
+    parser.add_argument('clip', help="Recorded video of a face")
+    parser.add_argument('--limit', type=int, default=300, help="Most frames read from the clip")
+    parser.add_argument('--redetect-every', type=int, default=30, help="EmotionEngine full-frame search interval")
+    args = parser.parse_args()
+
+    frames = read_clip(args.clip, args.limit)
+    if not frames:
+        raise SystemExit(f"{args.clip}: no frames")
+
+    legacy_analyze(frames[0])  # DeepFace builds its models on the first call; don't count that
+    start = time.perf_counter()
+    reference = [dominant(legacy_analyze(frame)) for frame in frames]
+    legacy_fps = len(frames) / (time.perf_counter() - start)
+
+    engine = EmotionEngine(redetect_every=args.redetect_every)
+    engine.classify([engine.crop(frames[0], (0, 0, 48, 48))])  # warm up the model
+    full_searches = 0
+    results = []
+    start = time.perf_counter()
+    for frame in frames:
+        tracked = engine.track.box is not None and engine.track.frames_tracked < engine.redetect_every
+        results.append(dominant(engine.analyze(frame)))
+        full_searches += not tracked or engine.track.frames_tracked == 0
+    engine_fps = len(frames) / (time.perf_counter() - start)
+
+    found = [(ref, res) for ref, res in zip(reference, results) if res is not None]
+    agreement = sum(ref == res for ref, res in found) / len(found) if found else float('nan')
+    print(f"{args.clip}: {len(frames)} frames {frames[0].shape[1]}x{frames[0].shape[0]}, {len(EMOTIONS)} emotions")
+    print(f"  DeepFace.analyze per frame {legacy_fps:8.1f} fps")
+    print(f"  EmotionEngine              {engine_fps:8.1f} fps ({engine_fps / legacy_fps:.1f}x)")
+    print(f"  face found in {len(found)}/{len(frames)} frames, whole-frame searches {full_searches}, "
+          f"same dominant emotion {agreement:.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,46 +1,226 @@
 import cv2
 from deepface import DeepFace
-from collections import deque
+import threading
 import numpy as np
 
-# Initialize a queue to store emotion probabilities for smoothing
-emotion_queue = deque(maxlen=10)  # Store probabilities for the last 10 frames
+# Output order of DeepFace's emotion model
+EMOTIONS = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
 
-def detect_emotion(frame):
+
+class EmotionSmoother:
+    """
+    Running average of emotion probabilities over the last frames, in O(1) per frame.
+    The last `window` score vectors are kept in a fixed array next to their running
+    sum, so a new frame only replaces the oldest row instead of re-averaging every
+    frame. With `alpha` it keeps an exponential moving average instead.
+    Args:
+        window (int): frames averaged.
+        alpha (float): weight of the newest frame for an exponential moving average, or None.
+    """
+
+    def __init__(self, window=10, alpha=None):
+        self.window = window
+        self.alpha = alpha
+        self.history = np.zeros((window, len(EMOTIONS)))
+        self.total = np.zeros(len(EMOTIONS))
+        self.count = 0
+        self.position = 0
+
+    def update(self, scores):
+        """Add one frame's probabilities (in EMOTIONS order)."""
+        scores = np.asarray(scores, dtype=np.float64)
+        if self.alpha is not None:
+            self.total = scores.copy() if self.count == 0 else self.total + self.alpha * (scores - self.total)
+            self.count += 1
+            return
+        if self.count == self.window:
+            self.total -= self.history[self.position]
+        else:
+            self.count += 1
+        self.history[self.position] = scores
+        self.total += scores
+        self.position = (self.position + 1) % self.window
+        if self.position == 0:
+            self.total = self.history[:self.count].sum(axis=0)  # drop rounding drift once per window
+
+    def probabilities(self):
+        """Smoothed probabilities as a dict (empty before the first frame)."""
+        if self.count == 0:
+            return {}
+        mean = self.total if self.alpha is not None else self.total / self.count
+        return dict(zip(EMOTIONS, mean.tolist()))
+
+    def emotion(self):
+        """The dominant smoothed emotion, 'neutral' before the first frame."""
+        return EMOTIONS[int(np.argmax(self.total))] if self.count else "neutral"
+
+
+class FaceTrack:
+    """Where one video stream's face was last seen, for EmotionEngine.find_face."""
+
+    def __init__(self):
+        self.box = None  # last face (x, y, w, h) in frame coordinates
+        self.frames_tracked = 0
+
+
+class EmotionEngine:
     """
-    Detects the emotion of a given video frame using DeepFace.
+    Emotion classifier that stays loaded between frames.
+    DeepFace.analyze rebuilds its pipeline and runs face detection on the whole
+    frame on every call. The engine loads DeepFace's emotion CNN once, finds the
+    face with OpenCV's Haar cascade on a downscaled frame, then only searches a
+    small window around the last face box on the next frames until the face is
+    lost, and classifies just the 48x48 grey face crop. Each stream keeps its own
+    FaceTrack; analyze_batch classifies the faces of many streams in one forward pass.
+    Args:
+        detect_width (int): width frames are downscaled to for the full-frame face search.
+        redetect_every (int): frames after which the whole frame is searched again anyway.
+        margin (float): how far around the last box (in box sizes) the face is looked for.
+    """
+
+    FACE_SIZE = (48, 48)
+
+    def __init__(self, detect_width=320, redetect_every=30, margin=0.5):
+        self.detect_width = detect_width
+        self.redetect_every = redetect_every
+        self.margin = margin
+        self.face_detector = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+        self.model = self._load_model()
+        self.track = FaceTrack()  # used when no track is given
+
+    @staticmethod
+    def _load_model():
+        try:
+            model = DeepFace.build_model("Emotion", task="facial_attribute")
+        except TypeError:  # deepface < 0.0.90 has no task argument
+            model = DeepFace.build_model("Emotion")
+        return getattr(model, "model", model)  # newer versions wrap the Keras model
+
+    def find_face(self, frame, track=None):
+        """The face box (x, y, w, h), following the previous one when possible; None if there is no face."""
+        track = self.track if track is None else track
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        box = None
+        if track.box is not None and track.frames_tracked < self.redetect_every:
+            box = self._search_near(gray, track.box)
+        if box is None:
+            box = self._search_frame(gray)
+            track.frames_tracked = 0
+        else:
+            track.frames_tracked += 1
+        track.box = box
+        return box
+
+    def crop(self, frame, box):
+        """Grey 48x48 face crop scaled to [0, 1], as the emotion model expects."""
+        x, y, w, h = box
+        face = frame[y:y + h, x:x + w]
+        if face.ndim == 3:
+            face = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(face, self.FACE_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32) / 255.0
+
+    def classify(self, faces):
+        """
+        Emotion probabilities of face crops in one forward pass.
+        Args:
+            faces (list): 48x48 crops from crop().
+        Returns:
+            ndarray: (len(faces), len(EMOTIONS)) probabilities in percent, like DeepFace.analyze.
+        """
+        if len(faces) == 0:
+            return np.zeros((0, len(EMOTIONS)), dtype=np.float32)
+        batch = np.stack(faces)[..., np.newaxis]
+        return np.asarray(self.model.predict_on_batch(batch), dtype=np.float32) * 100
+
+    def analyze(self, frame, track=None):
+        """Emotion probabilities of the face in the frame as a dict, or None when there is no face."""
+        scores = self.analyze_batch([frame], [track])[0]
+        return None if scores is None else dict(zip(EMOTIONS, scores.tolist()))
+
+    def analyze_batch(self, frames, tracks, faces=None):
+        """
+        Emotion probabilities for frames of different streams, classified in one forward pass.
+        Args:
+            frames (list): BGR frames, or grey / BGR face crops where `faces` says so.
+            tracks (list): the FaceTrack of each frame's stream (None for the engine's own).
+            faces (list): True for images that are already cropped to the face; None if none are.
+        Returns:
+            list: probabilities (EMOTIONS order) of each frame, None where there is no face
+                or the frame could not be processed.
+        """
+        faces = faces or [False] * len(frames)
+        found, crops = [], []
+        for i, (frame, track, face) in enumerate(zip(frames, tracks, faces)):
+            # One unusable frame must not fail the other streams' frames
+            try:
+                box = (0, 0, frame.shape[1], frame.shape[0]) if face else self.find_face(frame, track)
+                if box is not None:
+                    crops.append(self.crop(frame, box))
+                    found.append(i)
+            except Exception as e:
+                print(f"Error detecting emotion: {e}")
+        scores = self.classify(crops)
+        results = [None] * len(frames)
+        for i, row in zip(found, scores):
+            results[i] = row
+        return results
+
+    def _search_frame(self, gray):
+        scale = min(1.0, self.detect_width / gray.shape[1])
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else gray
+        faces = self.face_detector.detectMultiScale(small, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+        if len(faces) == 0:
+            return None
+        x, y, w, h = max(faces, key=lambda f: f[2] * f[3])  # the closest face
+        return tuple(int(round(v / scale)) for v in (x, y, w, h))
+
+    def _search_near(self, gray, box):
+        x, y, w, h = box
+        left, top = max(0, int(x - self.margin * w)), max(0, int(y - self.margin * h))
+        right = min(gray.shape[1], int(x + w * (1 + self.margin)))
+        bottom = min(gray.shape[0], int(y + h * (1 + self.margin)))
+        faces = self.face_detector.detectMultiScale(gray[top:bottom, left:right], scaleFactor=1.1, minNeighbors=5,
+                                                    minSize=(int(w * 0.6), int(h * 0.6)))
+        if len(faces) == 0:
+            return None
+        fx, fy, fw, fh = max(faces, key=lambda f: f[2] * f[3])
+        return int(fx + left), int(fy + top), int(fw), int(fh)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """The shared EmotionEngine, loaded on first use (call at startup to warm it up)."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = EmotionEngine()
+        return _engine
+
+
+# Smoothing of detect_emotion, over the last 10 frames
+emotion_smoother = EmotionSmoother(window=10)
+
+
+def detect_emotion(frame, smoother=None):
+    """
+    Detects the emotion of a given video frame using the shared EmotionEngine.
     Args:
         frame (ndarray): The video frame to analyze.
+        smoother (EmotionSmoother): the stream's smoothing state; None for the module's own.
     Returns:
         str: The stabilized detected emotion, or 'neutral' if detection fails.
     """
+    smoother = emotion_smoother if smoother is None else smoother
     try:
-        # Convert the frame to RGB (DeepFace requires RGB format)
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        # Analyze the frame for emotions
-        analysis = DeepFace.analyze(frame_rgb, actions=['emotion'], enforce_detection=False)
-        
-        # Debugging: Print the raw analysis output
-        print("Analysis Output:", analysis)
-        
-        # Extract emotions based on the output format
-        if isinstance(analysis, list):
-            emotions = analysis[0]["emotion"]
-        elif isinstance(analysis, dict):
-            emotions = analysis["emotion"]
-        else:
-            raise ValueError("Unexpected DeepFace output format")
-
-        # Add current probabilities to the queue
-        emotion_queue.append(emotions)
-
-        # Average the probabilities over the queue for stabilization
-        avg_emotions = {key: np.mean([e[key] for e in emotion_queue]) for key in emotions.keys()}
+        scores = get_engine().analyze_batch([frame], [None])[0]
 
-        # Determine the dominant emotion from averaged probabilities
-        detected_emotion = max(avg_emotions, key=avg_emotions.get)
-        return detected_emotion
+        # No face in this frame: keep the emotion of the recent frames
+        if scores is not None:
+            smoother.update(scores)
+        return smoother.emotion()
     except Exception as e:
         print(f"Error detecting emotion: {e}")
         return "neutral"
@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import OrderedDict
+
+from emotion_model import EmotionSmoother, FaceTrack, get_engine
+
+# Session fed by the server's own camera
+CAMERA = "camera"
+
+
+class Listener:
+    """One client's emotion state: its face track, smoother and latest result."""
+
+    def __init__(self, window=10, alpha=None):
+        self.track = FaceTrack()
+        self.smoother = EmotionSmoother(window, alpha)
+        self.emotion = "neutral"
+        self.updated_at = None  # time.time() of the last analysis
+        self.analysed = 0
+        self.latest_frame = None
+        self.seen_at = time.monotonic()
+
+
+class EmotionWorker:
+    """
+    Keeps the smoothed emotion of every listener up to date in the background.
+    Frames come from the server camera (read on its own thread, so its buffer
+    never goes stale) or from clients through submit(). Each listener's newest
+    frame waits for the analysis thread, which takes the waiting frames of up to
+    `max_batch` listeners and classifies their faces in one forward pass, so
+    requests only read the last result instead of waiting for the model.
+    Args:
+        capture: cv2.VideoCapture feeding the CAMERA listener, or None.
+        engine: emotion_model.EmotionEngine; None for the shared one.
+        max_batch (int): most listeners' frames classified together.
+        min_interval (float): minimum seconds between two batches (at most 5 per second by default),
+            so the camera alone does not keep a core busy with the model.
+        idle_timeout (float): seconds without frames after which a listener is forgotten.
+        window, alpha: smoothing of each listener, see emotion_model.EmotionSmoother.
+    """
+
+    def __init__(self, capture=None, engine=None, max_batch=16, min_interval=0.2, idle_timeout=600.0,
+                 window=10, alpha=None):
+        self.capture = capture
+        self.engine = engine
+        self.max_batch = max_batch
+        self.min_interval = min_interval
+        self.idle_timeout = idle_timeout
+        self.window = window
+        self.alpha = alpha
+        self.batches = 0
+        self.frames = 0
+        self._listeners = {CAMERA: Listener(window, alpha)}
+        self._pending = OrderedDict()  # listener id -> (newest frame not analysed yet, is a face crop)
+        self._ready = threading.Condition()
+        self._stopped = threading.Event()
+        self._threads = [threading.Thread(target=self._analyse, daemon=True)]
+        if capture is not None:
+            self._threads.append(threading.Thread(target=self._read, daemon=True))
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        with self._ready:
+            self._ready.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def submit(self, frame, listener=CAMERA, face=False):
+        """
+        Queue a listener's frame for analysis; it replaces any frame of theirs still waiting.
+        Args:
+            frame (ndarray): BGR frame, or a grey / BGR image of just the face when `face` is set.
+            listener (str): whose frame it is.
+            face (bool): the client already cropped the face, so face detection is skipped.
+        """
+        with self._ready:
+            state = self._listeners.get(listener)
+            if state is None:
+                state = self._listeners[listener] = Listener(self.window, self.alpha)
+            state.latest_frame = frame
+            state.seen_at = time.monotonic()
+            self._pending.pop(listener, None)
+            self._pending[listener] = (frame, face)
+            self._ready.notify_all()
+
+    def latest_frame(self, listener=CAMERA):
+        with self._ready:
+            state = self._listeners.get(listener)
+            return None if state is None else state.latest_frame
+
+    def latest(self, listener=CAMERA):
+        """The listener's last emotion with when it was detected and how old it is (seconds); None if unknown."""
+        with self._ready:
+            state = self._listeners.get(listener)
+            if state is None:
+                return None
+            emotion, updated_at, analysed = state.emotion, state.updated_at, state.analysed
+        return {
+            "emotion": emotion,
+            "updated_at": updated_at,
+            "age": None if updated_at is None else time.time() - updated_at,
+            "frames_analysed": analysed,
+        }
+
+    def forget(self, listener):
+        with self._ready:
+            self._listeners.pop(listener, None)
+            self._pending.pop(listener, None)
+
+    def stats(self):
+        with self._ready:
+            return {
+                "listeners": len(self._listeners),
+                "queued": len(self._pending),
+                "batches": self.batches,
+                "frames": self.frames,
+                "mean_batch": self.frames / self.batches if self.batches else 0.0,
+            }
+
+    def _read(self):
+        while not self._stopped.is_set():
+            ret, frame = self.capture.read()
+            if not ret:
+                time.sleep(0.1)  # camera busy or unplugged; try again
+                continue
+            self.submit(frame)
+
+    def _take(self):
+        with self._ready:
+            self._ready.wait_for(lambda: self._pending or self._stopped.is_set())
+            if self._stopped.is_set():
+                return None
+            batch = []
+            while self._pending and len(batch) < self.max_batch:
+                listener, (frame, face) = self._pending.popitem(last=False)
+                batch.append((self._listeners[listener], frame, face))
+            self.batches += 1
+            self.frames += len(batch)
+            self._expire()
+            return batch
+
+    def _expire(self):
+        now = time.monotonic()
+        for listener, state in list(self._listeners.items()):
+            if listener != CAMERA and now - state.seen_at > self.idle_timeout:
+                del self._listeners[listener]
+
+    def _analyse(self):
+        engine = self.engine or get_engine()
+        while True:
+            batch = self._take()
+            if batch is None:
+                return
+            started = time.monotonic()
+            try:
+                results = engine.analyze_batch([frame for _, frame, _ in batch], [state.track for state, _, _ in batch],
+                                               [face for _, _, face in batch])
+            except Exception as e:
+                print(f"Error detecting emotion: {e}")
+                continue
+            with self._ready:
+                for (state, _, _), scores in zip(batch, results):
+                    # No face in this frame: keep the emotion of the recent frames
+                    if scores is not None:
+                        state.smoother.update(scores)
+                    state.emotion = state.smoother.emotion()
+                    state.updated_at = time.time()
+                    state.analysed += 1
+            time.sleep(max(0.0, self.min_interval - (time.monotonic() - started)))